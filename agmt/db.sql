@@ -58,7 +58,8 @@ CREATE TABLE sources (
 	created_at_date timestamp with time zone DEFAULT CURRENT_TIMESTAMP(2),
 	content_id BIGINT REFERENCES content_types(content_id) NOT NULL,
 	language_id BIGINT REFERENCES languages(language_id) NOT NULL,
-	usfm_text json
+	usfm_text json,
+	text_version INT NOT NULL DEFAULT 0
 );
 
 CREATE TABLE translations (
@@ -113,3 +114,4 @@ CREATE TABLE translation_projects_look_up (
 	translation_id BIGINT REFERENCES translations(translation_id) NOT NULL,
 	project_id BIGINT REFERENCES autographamt_projects(project_id) NOT NULL
 );
+CREATE INDEX translation_projects_look_up_project_id_idx ON translation_projects_look_up (project_id, translation_id);
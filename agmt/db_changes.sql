@@ -1,2 +1,6 @@
 --Issue: 38, Date: 17-01-2020, Author: Revant
-ALTER TABLE versions ADD metadata jsonb;
\ No newline at end of file
+ALTER TABLE versions ADD metadata jsonb;
+--Project filter on the token translation list join, Date: 14-10-2026
+CREATE INDEX translation_projects_look_up_project_id_idx ON translation_projects_look_up (project_id, translation_id);
+--Version of the uploaded text of a source, bumped by uploadSource, Date: 14-10-2026
+ALTER TABLE sources ADD text_version INT NOT NULL DEFAULT 0;
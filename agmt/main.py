@@ -17,6 +17,8 @@ import datetime
 from datetime import timedelta
 import re
 import json
+# ujson based (de)serialization shipped with spacy, used for the large token and bible payloads
+import srsly
 import logging
 import traceback
 import flask
@@ -25,6 +27,8 @@ from flask import g
 from flask_cors import CORS, cross_origin
 import jwt
 import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
 import scrypt
 import psycopg2
 from psycopg2 import sql
@@ -32,19 +36,31 @@ from psycopg2.extras import execute_values
 from random import randint
 import phrases
 from functools import reduce
-import traceback
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from logging.handlers import RotatingFileHandler
 
-os.makedirs("../logs", exist_ok=True)
-logging.basicConfig(filename='../logs/Vachan_API.log', format='%(asctime)s|%(filename)s:%(lineno)d|%(levelname)-8s: %(message)s', datefmt='%m/%d/%Y %I:%M:%S %p')
+log_dir = os.path.join("..", "logs")
+log_file = os.path.join(log_dir, "Vachan_API.log")
+os.makedirs(log_dir, exist_ok=True)
+# a single rotating handler on the root logger, which this module's and the phrases module's
+# loggers propagate to. A second handler on log wrote each of its records to the file twice,
+# through two separate file handles. The file is opened on the first record, not at import
+handler = RotatingFileHandler(log_file, maxBytes=10000000, backupCount=10, delay=True)
+logging.basicConfig(handlers=[handler], format='%(asctime)s|%(filename)s:%(lineno)d|%(levelname)-8s: %(message)s', datefmt='%m/%d/%Y %I:%M:%S %p')
 log = logging.getLogger(__name__)
 log.setLevel(os.environ.get("AGMT_LOGGING_LEVEL", "WARNING"))
-handler = RotatingFileHandler("../logs/Vachan_API.log", maxBytes=10000000, backupCount=10)
-log.addHandler(handler)
 
 app = Flask(__name__)
 CORS(app)
 
+# shared HTTP session so that the notification mails and url lookups reuse pooled
+# keep-alive connections instead of a fresh TCP/TLS handshake on every call
+http_session = requests.Session()
+http_session.mount("https://", HTTPAdapter(pool_maxsize=32, \
+	max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504])))
+http_session.mount("http://", HTTPAdapter(pool_maxsize=32))
+
 sendinblue_key = os.environ.get("AGMT_SENDINBLUE_KEY")
 jwt_hs256_secret = os.environ.get("AGMT_HS256_SECRET", "x709myFlW5")
 postgres_host = os.environ.get("AGMT_POSTGRES_HOST", "localhost")
@@ -57,6 +73,32 @@ host_api_url = os.environ.get("AGMT_HOST_API_URL", "localhost:8000")
 host_ui_url = os.environ.get("AGMT_HOST_UI_URL","autographamt.com")
 system_email = os.environ.get("MTV2_EMAIL_ID", "autographamt@gmail.com")
 
+sendinblue_url = "https://api.sendinblue.com/v2.0/email"
+sendinblue_headers = {"api-key": sendinblue_key, "Content-Type": "application/json"}
+# POST is not retried by default. Only retry it when the connection could not be made, so the mail
+# was never sent: after a gateway error or a read timeout it may have been accepted already
+http_session.mount("https://api.sendinblue.com/", HTTPAdapter(max_retries=Retry(total=3, connect=3, \
+	read=0, status=0, backoff_factor=0.5, method_whitelist=frozenset(["POST"]))))
+# notification mails are handed over to a small pool of workers, so that the request
+# only prepares the payload and does not wait on the mail service to respond
+mail_executor = ThreadPoolExecutor(max_workers=4)
+
+# returns the response of the mail service, or None when the mail could not be sent
+def postMail(payload):
+	# serialised and encoded once, the adapter retries re-send the same bytes
+	body = json.dumps(payload).encode('utf-8')
+	try:
+		resp = http_session.post(sendinblue_url, data=body, headers=sendinblue_headers)
+		# only the status matters, the response body is not parsed
+		resp.raise_for_status()
+		return resp
+	except Exception as ex:
+		log.error("Sending mail to %s failed: %s", list(payload["to"]), ex)
+
+def sendMail(payload):
+	'''Queue a notification mail to be sent by the mail workers.'''
+	return mail_executor.submit(postMail, payload)
+
 def get_db():                                                                      #--------------To open database connection-------------------#
 	"""Opens a new database connection if there is none yet for the
 	current application context.
@@ -90,27 +132,78 @@ def getLid(bcv):
 	cursor.close()
 	return lid
 
+# bible_books_look_up is static seed data, so it is read once per process and reused
+bibleBookIdDict = {}
+bibleBookNameDict = {}
+
 def getBibleBookIds():
 	'''
-	Returns a tuple of two dictionarys of the books of the Bible, bookcode has bible book codes
-	as the key and bookname has bible book names as the key.
+	Returns a dictionary of the books of the Bible, with the book id as the key and
+	the book code as the value. The lookup table is queried only on the first call.
 	'''
-	bookIdDict = {}
-	connection  = get_db()
-	cursor = connection.cursor()
-	cursor.execute("SELECT book_id, book_name, book_code FROM bible_books_look_up Order by book_id")
-	rst = cursor.fetchall()
-	for book_id, book_name, book_code in rst:
-		bookIdDict[int(book_id)] = book_code
-	cursor.close()
-	return bookIdDict
+	if not bibleBookIdDict:
+		connection  = get_db()
+		cursor = connection.cursor()
+		cursor.execute("SELECT book_id, book_name, book_code FROM bible_books_look_up Order by book_id")
+		rst = cursor.fetchall()
+		for book_id, book_name, book_code in rst:
+			bibleBookIdDict[int(book_id)] = book_code
+			bibleBookNameDict[int(book_id)] = book_name
+		cursor.close()
+	return bibleBookIdDict
+
+def getBibleBook(bookCode):
+	'''
+	Returns the book id and the book name for a book code (lower or upper case),
+	or None if it is not the code of a book of the Bible. Served from the cached lookup.
+	'''
+	bookId = getBibleBookCodes().get(bookCode.lower())
+	if bookId is None:
+		return None
+	return bookId, bibleBookNameDict[bookId]
+
+bibleBookCodeDict = {}
+
+def getBibleBookCodes():
+	'''
+	Returns a dictionary of the books of the Bible, with the lower cased book code as the
+	key and the book id as the value. Built once from the cached book id lookup.
+	'''
+	if not bibleBookCodeDict:
+		for book_id, book_code in getBibleBookIds().items():
+			bibleBookCodeDict[book_code.lower()] = book_id
+	return bibleBookCodeDict
+
+def splitBibleTableName(tableName):
+	'''
+	Returns the language code and version of a bible table, as used by the phrases module.
+	The table names are of the form language_version_revision_bible, eg: hin_irv_4_bible
+	gives ('hin', 'irv_4').
+	'''
+	languageCode, _, version = tableName.partition('_')
+	return languageCode, version.rsplit('_', 1)[0]
 
 # pass the URL with http, if URL will have SSL then will return the same otherwise wihtout SSL URL will return
 def return_url(url):
-	r = requests.get(url)
+	r = http_session.get(url)
 	required_url = r.url
 	return required_url
 
+documentation_url = 'http://docs.vachanengine.org/'
+# the documentation url is looked up in its own pool, so that it doesn't wait behind queued mails
+url_executor = ThreadPoolExecutor(max_workers=2)
+
+def documentationUrl():
+	'''
+	Look the documentation url up with return_url. The plain url is used when the lookup
+	fails, so that a docs outage doesn't fail the request.
+	'''
+	try:
+		return return_url(documentation_url)
+	except Exception as ex:
+		log.warning("Documentation url lookup failed: %s", ex)
+		return documentation_url
+
 @app.route('/', methods=['GET'])
 def index():
  return jsonify({"message": "OK: I am live...url: http://autographamt.com/ "}), 200
@@ -124,7 +217,7 @@ def auth():
 	cursor.execute("SELECT email_id FROM autographamt_users WHERE  email_id = %s", (email,))
 	est = cursor.fetchone()
 	if not est:
-		logging.warning('Unregistered user \'%s\' login attempt unsuccessful' % email)
+		logging.warning('Unregistered user \'%s\' login attempt unsuccessful', email)
 		return '{"success":false, "message":"This email is not registered"}'
 	cursor.execute("SELECT u.password_hash, u.password_salt, r.role_name, u.first_name, u.last_name,status FROM \
 		autographamt_users u LEFT JOIN roles r ON u.role_id = r.role_id WHERE u.email_id = %s \
@@ -155,9 +248,9 @@ def auth():
 		except Exception as ex:
 			print(ex)
 			pass
-		logging.warning('User: \'' + str(email) + '\' logged in successfully')
+		logging.warning('User: \'%s\' logged in successfully', email)
 		return '{"accessToken": "%s"}\n' % (access_token.decode('utf-8'),)
-	logging.warning('User: \'' + str(email) + '\' login attempt unsuccessful: Incorrect Password')
+	logging.warning('User: \'%s\' login attempt unsuccessful: Incorrect Password', email)
 	return '{"success":false, "message":"Incorrect Password"}'
 
 @app.route("/v1/registrations", methods=["POST"])       #-----------------For user registrations-----------------#
@@ -166,37 +259,41 @@ def new_registration():
 	lastName = request.form['lastName']
 	email = request.form['email']
 	password = request.form['password']
-	headers = {"api-key": sendinblue_key}
-	url = "https://api.sendinblue.com/v2.0/email"
 	verification_code = str(uuid.uuid4()).replace("-", "")
-	documentation_url = return_url('http://docs.vachanengine.org/')
-	body = '''Hello %s,<br/><br/>Thanks for your interest to use the AutographaMT web service. <br/>
-	You need to confirm your email by opening this link:
-
-	https://%s/v1/verifications/%s
-
-	<br/><br/>The documentation for accessing the API is available at %s''' % \
-			(firstName, host_api_url, verification_code, documentation_url)
-	payload = {
-		"to": {email: ""},
-		"from": ["noreply@autographamt.in", "Autographa MT"],
-		"subject": "AutographaMT - Please verify your email address",
-		"html": body,
-		}
 	connection = get_db()
-	password_salt = str(uuid.uuid4()).replace("-", "")
-	password_hash = scrypt.hash(password, password_salt)
 	cursor = connection.cursor()
 	cursor.execute("SELECT user_id,status FROM autographamt_users WHERE email_id = %s", (email,))
 	rst = cursor.fetchone()
 	if not rst:
+		# look the documentation url up while the password is hashed
+		docsUrlLookup = url_executor.submit(documentationUrl)
+		password_salt = str(uuid.uuid4()).replace("-", "")
+		password_hash = scrypt.hash(password, password_salt)
+		docsUrl = docsUrlLookup.result()
 		cursor.execute("INSERT INTO autographamt_users (first_name, last_name, email_id, \
 			verification_code, password_hash, password_salt, created_at_date,status) \
 				VALUES (%s, %s, %s, %s, %s, %s, current_timestamp,true)", \
 					(firstName, lastName, email, verification_code, password_hash, password_salt))
 		cursor.close()
+		body = '''Hello %s,<br/><br/>Thanks for your interest to use the AutographaMT web service. <br/>
+		You need to confirm your email by opening this link:
+
+		https://%s/v1/verifications/%s
+
+		<br/><br/>The documentation for accessing the API is available at %s''' % \
+				(firstName, host_api_url, verification_code, docsUrl)
+		payload = {
+			"to": {email: ""},
+			"from": ["noreply@autographamt.in", "Autographa MT"],
+			"subject": "AutographaMT - Please verify your email address",
+			"html": body,
+			}
+		# sent before the user is saved and not queued, the user can't verify without the mail.
+		# When it isn't sent the user is not saved, so that the email can be registered again
+		if not postMail(payload):
+			connection.rollback()
+			return '{"success":false, "message":"Verification Email could not be sent. Please try again later"}'
 		connection.commit()
-		resp = requests.post(url, data=json.dumps(payload), headers=headers)
 		return '{"success":true, "message":"Verification Email has been sent to your email id"}'
 	else:
 		if rst[1] == False:
@@ -217,17 +314,15 @@ def reset_password():
 		active = rst[1]
 		if not active:
 			return '{"success":false, "message":"User account is deactivated."}'
-		headers = {"api-key": sendinblue_key}
-		url = "https://api.sendinblue.com/v2.0/email"
 		# totp = pyotp.TOTP('base32secret3232')       # python otp module
 		# verification_code = totp.now()
 		verification_code = randint(100001,999999)
-		documentation_url = return_url('http://docs.vachanengine.org/')
+		docsUrl = documentationUrl()
 		body = '''Hi,<br/><br/>Your request for resetting the password has been recieved. <br/>
 		Your temporary password is %s. Use this to create a new password at %s .
 
 		<br/><br/>The documentation for accessing the API is available at %s''' % \
-				(verification_code, host_ui_url, documentation_url)
+				(verification_code, host_ui_url, docsUrl)
 		payload = {
 			"to": {email: ""},
 			"from": ["noreply@autographamt.in", "AutographaMT"],
@@ -237,8 +332,11 @@ def reset_password():
 		cursor.execute("UPDATE autographamt_users SET verification_code= %s WHERE email_id = %s", \
 			(verification_code, email))
 		cursor.close()
+		# the temporary password is only saved once the mail with it has been sent
+		if not postMail(payload):
+			connection.rollback()
+			return '{"success":false, "message":"Password reset mail could not be sent. Please try again later"}\n'
 		connection.commit()
-		resp = requests.post(url, data=json.dumps(payload), headers=headers)
 		return '{"success":true, "message":"Link to reset password has been sent to the registered mail ID"}\n'
 
 @app.route("/v1/forgotpassword", methods=["POST"])    #--------------To set the new password-------------------#
@@ -404,8 +502,6 @@ def createOrganisations():
 				cursor.execute("SELECT email_id from autographamt_users where role_id=3")
 				all_super_admins = cursor.fetchall()
 				cursor.close()
-				headers = {"api-key": sendinblue_key}
-				url = "https://api.sendinblue.com/v2.0/email"
 				body = '''Hello Super Admin,<br/><br/>
 				A new organization request has come for, %s. Please check and approve.<br/><br/>
 				AutographaMT'''%(organisationName)
@@ -417,7 +513,7 @@ def createOrganisations():
 						"subject": "AutographaMT - New Organisation Request",
 						"html": body,
 						}
-					resp = requests.post(url, data=json.dumps(payload), headers=headers)
+					sendMail(payload)
 			except Exception as e:
 				print(e)
 				return '{"success":false, "message":"'+str(e)+'"}'
@@ -481,15 +577,14 @@ def getProjects():
 			userId = cursor.fetchone()[0]
 			cursor.execute("select organisation_id from autographamt_organisations where user_id=%s", (userId,))
 			organisationIds = [org[0] for org in cursor.fetchall()]
-			rst = []
-			for orgId in organisationIds:
-				cursor.execute("select p.project_id, p.project_name, p.source_id, p.target_id,  \
-					p.organisation_id, o.organisation_name, v.version_code, v.version_description, p.status \
-						from autographamt_projects p left join autographamt_organisations o on \
-						p.organisation_id=o.organisation_id left join sources s on \
-							s.source_id=p.source_id \
-							left join versions v on s.version_id = v.version_id where p.organisation_id=%s", (orgId,))
-				rst += cursor.fetchall()
+			# projects of all the organisations of the admin in one query
+			cursor.execute("select p.project_id, p.project_name, p.source_id, p.target_id,  \
+				p.organisation_id, o.organisation_name, v.version_code, v.version_description, p.status \
+					from autographamt_projects p left join autographamt_organisations o on \
+					p.organisation_id=o.organisation_id left join sources s on \
+						s.source_id=p.source_id \
+						left join versions v on s.version_id = v.version_id where p.organisation_id = ANY(%s)", (organisationIds,))
+			rst = cursor.fetchall()
 		elif role == 3:
 			cursor.execute("select p.project_id, p.project_name, p.source_id, p.target_id, \
 				p.organisation_id, o.organisation_name, v.version_code, v.version_description, p.status \
@@ -634,8 +729,6 @@ def createAssignments():
 		cursor.execute("SELECT project_name from autographamt_projects where project_id=%s",(projectId,))
 		project = cursor.fetchone()[0]
 		cursor.close()
-		headers = {"api-key": sendinblue_key}
-		url = "https://api.sendinblue.com/v2.0/email"
 		if action == "assign":
 			body = '''Hello %s,<br/><br/>
 			Your books assignment has changed to, %s, in project, %s.<br/><br/>
@@ -650,7 +743,7 @@ def createAssignments():
 			"subject": "AutographaMT - New work assignment",
 			"html": body,
 			}
-		resp = requests.post(url, data=json.dumps(payload), headers=headers)
+		sendMail(payload)
 	except Exception as e:
 		print(e)
 		return '{"success":false, "message":'+str(e)+'}'
@@ -681,13 +774,28 @@ def removeUserFromProject():
 		cursor.close()
 		return '{"success": true, "message":"User removed from Project"}'
 
-def convertStringToList(string):
-	if string == "":
-		array = []
-	else:
-		array = string.split("|")
+def convertStringToList(string, skipBlank=False):
+	'''
+	Returns a | separated string as a list, empty for an empty or NULL string.
+	With skipBlank the blank items are left out, as for the senses of a translation.
+	'''
+	if not string:
+		return []
+	array = string.split("|")
+	if skipBlank:
+		array = [item for item in array if item.strip()]
 	return array
 
+def uniqueBookCodes(books):
+	'''
+	Returns the requested book codes without repeats, compared case insensitively,
+	keeping the first spelling and the order, so that no book is fetched or tokenized twice.
+	'''
+	uniqueBooks = {}
+	for book in books:
+		uniqueBooks.setdefault(book.lower(), book)
+	return list(uniqueBooks.values())
+
 @app.route("/v1/autographamt/projects/translations/<token>/<projectId>", methods=["GET"])
 def getProjectTranslations(token, projectId):
 	connection = get_db()
@@ -699,10 +807,7 @@ def getProjectTranslations(token, projectId):
 
 	if rst:
 		translation, senses = rst
-		if senses.strip() == "":
-			senses = []
-		else:
-			senses = senses.split('|')
+		senses = convertStringToList(senses, skipBlank=True)
 		return json.dumps({
 			"translation":translation,
 			"senses":senses
@@ -737,15 +842,14 @@ def updateProjectTokenTranslations():
 		assignmentExists = cursor.fetchone()
 		if not assignmentExists:
 			return '{"success":false, "message":"UnAuthorized/ You haven\'t been assigned this project"}'
-		cursor.execute("select source_id, target_id from autographamt_projects where project_id=%s", (projectId,))
-		sourceId, targetLanguageId = cursor.fetchone()
-		cursor.execute("select language_code from languages where language_id=%s", (targetLanguageId,))
-		targetLanguageCode = cursor.fetchone()
+		# the project, its target language and its source are checked in one round trip
+		cursor.execute("select p.source_id, p.target_id, l.language_code, s.source_id from autographamt_projects p \
+			left join languages l on p.target_id=l.language_id left join sources s on p.source_id=s.source_id \
+			where p.project_id=%s", (projectId,))
+		sourceId, targetLanguageId, targetLanguageCode, sourceExists = cursor.fetchone()
 		if not targetLanguageCode:
 			return '{"success":false, "message":"Target Language does not exist"}'
-		cursor.execute("select * from sources where source_id=%s", (sourceId,))
-		rst = cursor.fetchone()
-		if not rst:
+		if not sourceExists:
 			return '{"success":false, "message":"Source does not exist"}'
 		cursor.execute("select t.token, t.translation, t.senses from translations t left join \
 			translation_projects_look_up p on t.translation_id=p.translation_id where p.project_id=%s and \
@@ -784,7 +888,7 @@ def updateProjectTokenTranslations():
 			return '{"success":true, "message":"Translation has been updated"}'
 	except Exception as ex:
 		print(ex)
-		logging.warning('translation one by one \'%s\'' % ex)
+		logging.warning('translation one by one \'%s\'', ex)
 		return '{"success": false, "message":"Server side error"}'
 
 
@@ -811,15 +915,14 @@ def bulkUpdateProjectTokenTranslations():
 		assignmentExists = cursor.fetchone()
 		if not assignmentExists:
 			return '{"success":false, "message":"UnAuthorized/ You haven\'t been assigned this project"}'
-		cursor.execute("select source_id, target_id from autographamt_projects where project_id=%s", (projectId,))
-		sourceId, targetLanguageId = cursor.fetchone()
-		cursor.execute("select language_code from languages where language_id=%s", (targetLanguageId,))
-		targetLanguageCode = cursor.fetchone()
+		# the project, its target language and its source are checked in one round trip
+		cursor.execute("select p.source_id, p.target_id, l.language_code, s.source_id from autographamt_projects p \
+			left join languages l on p.target_id=l.language_id left join sources s on p.source_id=s.source_id \
+			where p.project_id=%s", (projectId,))
+		sourceId, targetLanguageId, targetLanguageCode, sourceExists = cursor.fetchone()
 		if not targetLanguageCode:
 			return '{"success":false, "message":"Target Language does not exist"}'
-		cursor.execute("select * from sources where source_id=%s", (sourceId,))
-		rst = cursor.fetchone()
-		if not rst:
+		if not sourceExists:
 			return '{"success":false, "message":"Source does not exist"}'
 		if not (tokenTranslations):
 			return '{"success":false, "message":"There is no data in excel"}'
@@ -827,6 +930,13 @@ def bulkUpdateProjectTokenTranslations():
 		empty_translation = 0
 		empty_senses = 0
 		empty_tokenName = 0
+		# fetch the existing translations of all the tokens in one query, instead of one per token
+		requestTokens = [item["token"] for item in tokenTranslations if "token" in item]
+		cursor.execute("select t.token, t.translation, t.senses from translations t left join \
+			translation_projects_look_up p on t.translation_id=p.translation_id where p.project_id=%s and \
+			t.token = ANY(%s)",(projectId, requestTokens))
+		projectTranslations = {row[0]:row for row in cursor.fetchall()}
+		historyData = []
 		for item in tokenTranslations:
 			if (("token" not in item) and ("translation" not in item) and ("senses" not in item)):  #if all fields are empty
 				pass
@@ -841,15 +951,12 @@ def bulkUpdateProjectTokenTranslations():
 				token = item['token']
 				translation = item['translation']
 				senses = item['senses']
-				logging.warning('senses \'%s\'' % senses)
+				log.debug('senses \'%s\'', senses)
 				splitSense = senses.split(',')
-				logging.warning('splitSense \'%s\'' % splitSense)
+				log.debug('splitSense \'%s\'', splitSense)
 				if "" in splitSense:
 					splitSense.remove("")
-				cursor.execute("select t.token, t.translation, t.senses from translations t left join \
-					translation_projects_look_up p on t.translation_id=p.translation_id where p.project_id=%s and \
-					token=%s",(projectId, token))
-				rst = cursor.fetchone()
+				rst = projectTranslations.get(token)
 				if not rst:
 					senses = '|'.join(splitSense)
 					cursor.execute("insert into translations (token, translation, source_id, target_id, \
@@ -858,33 +965,26 @@ def bulkUpdateProjectTokenTranslations():
 					translationId = cursor.fetchone()[0]
 					cursor.execute("insert into translation_projects_look_up (translation_id, project_id) values \
 						(%s, %s)", (translationId, projectId))
-					cursor.execute("insert into translations_history (token, translation, source_id, target_id, \
-						user_id, senses) values (%s, %s, %s, %s, %s, %s)", (token, translation, sourceId, targetLanguageId, \
-							userId, senses))
 				else:
 					dbSenses = []
 					if rst[2] != None:
-							logging.warning('rst[2] \'%s\'' % rst[2])
+							log.debug('rst[2] \'%s\'', rst[2])
 							dbSenses = rst[2].split("|")
-							logging.warning('dbSenses \'%s\'' % dbSenses)
+							log.debug('dbSenses \'%s\'', dbSenses)
 					for sense in splitSense:
 						if sense not in dbSenses:
 							dbSenses.append(sense)
 					senses = "|".join(dbSenses)
 					cursor.execute("update translations set translation=%s, user_id=%s, senses=%s where source_id=%s and \
 							target_id=%s and token=%s",(translation, userId, senses, sourceId, targetLanguageId, token))
-					cursor.execute("insert into translations_history (token, translation, source_id, target_id, \
-							user_id, senses) values (%s, %s, %s, %s, %s, %s)", (token, translation, sourceId, targetLanguageId, \
-								userId, senses))
+				projectTranslations[token] = (token, translation, senses)
+				historyData.append((token, translation, sourceId, targetLanguageId, userId, senses))
 			
 			elif(("token" in item) and ("translation" in item) and ("senses" not in item)): # if only senses are not available
 				empty_senses += 1
 				token = item['token']
 				translation = item['translation']
-				cursor.execute("select t.token, t.translation from translations t left join \
-					translation_projects_look_up p on t.translation_id=p.translation_id where p.project_id=%s and \
-					token=%s",(projectId, token))
-				rst = cursor.fetchone()
+				rst = projectTranslations.get(token)
 				if not rst:
 					# senses = '|'.join(splitSense)
 					cursor.execute("insert into translations (token, translation, source_id, target_id, \
@@ -893,9 +993,7 @@ def bulkUpdateProjectTokenTranslations():
 					translationId = cursor.fetchone()[0]
 					cursor.execute("insert into translation_projects_look_up (translation_id, project_id) values \
 						(%s, %s)", (translationId, projectId))
-					cursor.execute("insert into translations_history (token, translation, source_id, target_id, \
-						user_id) values (%s, %s, %s, %s, %s)", (token, translation, sourceId, targetLanguageId, \
-							userId))
+					projectTranslations[token] = (token, translation, None)
 				else:
 					# dbSenses = []
 					# if rst[2] != "":
@@ -906,17 +1004,18 @@ def bulkUpdateProjectTokenTranslations():
 					# senses = "|".join(dbSenses)
 					cursor.execute("update translations set translation=%s, user_id=%s where source_id=%s and \
 							target_id=%s and token=%s",(translation, userId, sourceId, targetLanguageId, token))
-					cursor.execute("insert into translations_history (token, translation, source_id, target_id, \
-							user_id) values (%s, %s, %s, %s, %s)", (token, translation, sourceId, targetLanguageId, \
-								userId))
+				historyData.append((token, translation, sourceId, targetLanguageId, userId, None))
 			else:
 				pass
+		# all the history rows go in with one statement, committed together with the translations
+		execute_values(cursor, "insert into translations_history (token, translation, source_id, target_id, \
+			user_id, senses) values %s", historyData)
 		connection.commit()
 		cursor.close()
 		return '{"success":true, "message":"Translations have been added.\\nEmpty token(s)  '+str(empty_tokenName)+' \\nEmpty translation(s)  '+str(empty_translation)+'\\nEmpty sense(s)  '+str(empty_senses)+'"}'
 	except Exception as ex:
 		print(ex)
-		logging.warning('bulktranslations exception \'%s\'' % ex)
+		logging.warning('bulktranslations exception \'%s\'', ex)
 		return '{"success": false, "message":"Server side error"}'
 
 
@@ -989,8 +1088,6 @@ def organisationApprovals():
 				cursor.execute("SELECT organisation_name from autographamt_organisations where organisation_id=%s",(organisationId,))
 				org_name = cursor.fetchone()[0]
 				cursor.close()
-				headers = {"api-key": sendinblue_key}
-				url = "https://api.sendinblue.com/v2.0/email"
 				if verified:
 					body = '''Hello %s,<br/><br/>
 					Your request to create organization,%s, has been approved.<br/><br/>
@@ -1005,7 +1102,7 @@ def organisationApprovals():
 					"subject": "AutographaMT - New Organisation",
 					"html": body,
 					}
-				resp = requests.post(url, data=json.dumps(payload), headers=headers)
+				sendMail(payload)
 			except Exception as e:
 				print(e)
 				return '{"success":false, "message":'+str(e)+'}'
@@ -1028,40 +1125,29 @@ def getProjectStatistics(projectId):
 		if not rst:
 			return '{"sucess":false, "message":"Invalid project id"}'
 		tableName = rst[0] + "_tokens"
-		bookDict = {}
-		cursor.execute("select book_id, book_name, book_code from bible_books_look_up")
-		for b_id, b_name, b_code in cursor.fetchall():
-			bookDict[b_id] = {
-				"name": b_name,
-				"code": b_code
-			}
-		cursor.execute("select book_id, token from " + tableName)
-		bookWiseTokens = {}
-		for book_id, token in cursor.fetchall():
-			if book_id in bookWiseTokens:
-				bookWiseTokens[book_id] = bookWiseTokens[book_id] + [token]
-			else:
-				bookWiseTokens[book_id] = [token]
-		cursor.execute("select t.token from translations t left join translation_projects_look_up tl on \
-			t.translation_id=tl.translation_id where tl.project_id=%s", (projectId,))
-		translatedTokens = [item[0] for item in cursor.fetchall()]
+		bookIdDict = getBibleBookIds()
+		# the tokens are counted per book by the database, instead of pulling every token of the
+		# source and every translated token of the project to count them here
+		cursor.execute(sql.SQL("select b.book_id, count(*), count(distinct b.token), count(distinct pt.token) \
+			from {} b left join (select distinct t.token from translations t join translation_projects_look_up tl \
+			on t.translation_id=tl.translation_id where tl.project_id=%s) pt on b.token=pt.token \
+			group by b.book_id order by b.book_id").format(sql.Identifier(tableName)), (projectId,))
+		bookWiseCounts = cursor.fetchall()
 		projectStatistics = {}
 		cursor.close()
 		pendingPercentageList = []
 		completedPercentageList = []
-		for key in bookWiseTokens.keys():
-			bookCode = bookDict[key]["code"]
-			bookName = bookDict[key]["name"]
-			bookTokenList = bookWiseTokens[key]
-			translatedTokensInBook = set(bookTokenList) & set(translatedTokens)
-			unTranslatedTokenList = set(bookTokenList) - translatedTokensInBook
-			pendingPercentage = float("{0:.2f}".format(len(unTranslatedTokenList) / len(bookTokenList) * 100))
-			completedPercentage = float("{0:.2f}".format(len(translatedTokensInBook) / len(bookTokenList) * 100))
+		for key, allTokensCount, uniqueTokensCount, translatedTokensCount in bookWiseCounts:
+			bookCode = bookIdDict[key]
+			bookName = bibleBookNameDict[key]
+			# every book in the counts has at least one token, allTokensCount is never 0
+			pendingPercentage = round((uniqueTokensCount - translatedTokensCount) / allTokensCount * 100, 2)
+			completedPercentage = round(translatedTokensCount / allTokensCount * 100, 2)
 			pendingPercentageList.append(pendingPercentage)
 			completedPercentageList.append(completedPercentage)
 			projectStatistics[bookCode] = {
-				"allTokensCount": len(bookTokenList),
-				"translatedTokensCount": len(translatedTokensInBook),
+				"allTokensCount": allTokensCount,
+				"translatedTokensCount": translatedTokensCount,
 				"completed": completedPercentage,
 				"pending": pendingPercentage,
 				"bookName": bookName,
@@ -1070,8 +1156,8 @@ def getProjectStatistics(projectId):
 			pendingTokensStatus = 0
 			completedTokensStatus = 0
 		else:
-			pendingTokensStatus = float("{0:.2f}".format(reduce(lambda x, y: x + y, pendingPercentageList) / len(pendingPercentageList)))
-			completedTokensStatus = float("{0:.2f}".format(reduce(lambda x, y: x + y, completedPercentageList) / len(completedPercentageList)))
+			pendingTokensStatus = round(sum(pendingPercentageList) / len(pendingPercentageList), 2)
+			completedTokensStatus = round(sum(completedPercentageList) / len(completedPercentageList), 2)
 
 		return json.dumps({
 			"bookWiseData":projectStatistics,
@@ -1142,7 +1228,6 @@ def availableProjectBooks(projectId, userId):
 		tablename = cursor.fetchone()[0]
 		cursor.execute(sql.SQL("select l.book_code from {} as b join bible_books_look_up as l on b.book_id=l.book_id").format(sql.Identifier(tablename)))
 		rst = cursor.fetchall()
-		print("rst:",rst)
 		if not rst:
 			return '{"success":false, "message":"No Books uploaded under this source"}'
 		allBooks = [t[0] for t in rst]
@@ -1159,8 +1244,9 @@ def availableProjectBooks(projectId, userId):
 			assignedBooks = []
 		booksArray = {}
 
+		assignedBookSet = set(assignedBooks)
 		for book in allBooks:
-			if book not in assignedBooks:
+			if book not in assignedBookSet:
 				booksArray[book] = {
 						"assigned":False
 					}
@@ -1176,44 +1262,53 @@ def availableProjectBooks(projectId, userId):
 @app.route("/v1/tokenlist/<sourceId>", methods=["GET"])
 def getTokenLists(sourceId):
 	only_words = bool(request.args.get("only_words", False))
-	books = request.args.getlist('books')
-	log.info("comes to getTokenLists for "+str(books))
+	books = uniqueBookCodes(request.args.getlist('books'))
+	log.info("comes to getTokenLists for %s", books)
 	if len(books) == 0:
 		return '{"success":false, "message":"No books selected for tokens request"}'
 	connection = get_db()
 	cursor = connection.cursor()
 	cursor.execute("select table_name from sources where source_id=%s", (sourceId,))
 	rst = cursor.fetchone()
+	bookCodeDict = getBibleBookCodes()
 	bookIds = []
 	for book in books:
-		cursor.execute("select book_id from bible_books_look_up where book_code=%s", (book.lower(),))
-		bookIds.append(cursor.fetchone()[0])
+		bookId = bookCodeDict.get(book.lower())
+		if not bookId:
+			return '{"success":false, "message":"Invalid book code, '+book+'. The 3 letter code expected."}'
+		bookIds.append(bookId)
 	tablename = rst[0] + '_tokens'
-	tablename_parts = tablename.split('_')
-	languageCode = tablename_parts[0]
-	version = '_'.join(tablename_parts[1:-2])
-	tokenList = []
+	languageCode, version = splitBibleTableName(rst[0])
+	# the tokens of all the requested books in one query, only the books that are not
+	# tokenized yet need another one
+	bookTokens = {bookId:[] for bookId in bookIds}
+	cursor.execute(sql.SQL("select book_id, token from {} where book_id = ANY(%s)").format(sql.Identifier(tablename)), (bookIds,))
+	for bookId, token in cursor:
+		bookTokens[bookId].append(token)
+	# the books that are not tokenized yet are tokenized together and read back in one query
+	untokenizedBooks = [bookId for bookId in bookTokens if not bookTokens[bookId]]
+	if untokenizedBooks:
+		try:
+			log.info("comes here to tokenize books:%s", untokenizedBooks)
+			phrases.tokenize_books(connection, languageCode.lower(), version.lower() , untokenizedBooks)
+			cursor.execute(sql.SQL("select book_id, token from {} where book_id = ANY(%s)").format(sql.Identifier(tablename)), (untokenizedBooks,))
+			for bookId, token in cursor:
+				bookTokens[bookId].append(token)
+		except Exception as ex:
+			log.error(ex)
+			return '{"success":false, "message":"Phrases method error"}'
+	# a dict keeps the tokens unique in first seen order, the membership test on a list
+	# scanned all the tokens collected so far for every token
+	tokenList = {}
 	for bookId in bookIds:
-		this_book_tokens = []
-		cursor.execute(sql.SQL("select token from {} where book_id=%s").format(sql.Identifier(tablename)), (bookId,))
-		this_book_tokens = [item[0] for item in cursor.fetchall()]
-		if len(this_book_tokens)==0:
-			try:
-				log.info("comes here to tokenize book:"+str(bookId))
-				phrases.tokenize(connection, languageCode.lower(), version.lower() , bookId)
-				cursor.execute("select token from " + tablename + " where book_id=%s", (bookId,))
-				this_book_tokens = [item[0] for item in cursor.fetchall()]
-			except Exception as ex:
-				log.error(ex)
-				return '{"success":false, "message":"Phrases method error"}'
+		this_book_tokens = bookTokens[bookId]
 		for item in this_book_tokens:
 			if only_words and " " in item:
 				continue
-			if item not in tokenList:
-				tokenList.append(item)
+			tokenList[item] = None
+	tokenList = list(tokenList)
 	cursor.close()
-	jsonOut = json.dumps(tokenList)
-	# print(jsonOut)
+	jsonOut = srsly.json_dumps(tokenList)
 	return jsonOut
 
 @app.route("/v1/tokentranslationlist/<projectId>", methods=["GET"])
@@ -1239,8 +1334,8 @@ def getTokenTranslationList(projectId):
 	the requirement from UI side (the xlsx npm module)
 	'''
 	only_words = bool(request.args.get("only_words", False))
-	books = request.args.getlist('books')
-	log.info("comes to getTokenLists for "+str(books))
+	books = uniqueBookCodes(request.args.getlist('books'))
+	log.info("comes to getTokenLists for %s", books)
 	if len(books) == 0:
 		return '{"success":false, "message":"No books selected for tokens request"}'
 
@@ -1255,8 +1350,10 @@ def getTokenTranslationList(projectId):
 		cursor.execute("select books from autographamt_assignments where user_id=%s and \
 			project_id=%s", (userId, projectId))
 		assignments = cursor.fetchone()
+		# split the assigned books once, rather than re-splitting them for every requested book
+		assignedBooks = set(assignments[0].split('|')) if assignments else set()
 		for book in books:
-			if (not assignments) or (book.lower() not in assignments[0].split('|')):
+			if book.lower() not in assignedBooks:
 				return '{"success":false, "message":"UnAuthorized! You haven\'t been assigned the book/project('+book+')"}'
 
 		cursor.execute("select s.table_name from sources as s join autographamt_projects as p \
@@ -1264,26 +1361,24 @@ def getTokenTranslationList(projectId):
 		source_table = cursor.fetchone()[0]
 		tablename = source_table + '_tokens'
 		tokenList = {}
+		# only the translations of this project are joined to the tokens. Filtering them in python
+		# pulled back the translations of the token from every other project as well
+		tokenQuery = sql.SQL("SELECT s.token, t.translation, t.senses, l.project_id FROM {} s \
+			LEFT JOIN (translations t JOIN translation_projects_look_up l \
+			ON t.translation_id = l.translation_id AND l.project_id = %s) ON s.token = t.token \
+			where s.book_id=%s;").format(sql.Identifier(tablename))
+		bookCodeDict = getBibleBookCodes()
 		for book in books:
-			cursor.execute("select book_id from bible_books_look_up where book_code=%s", (book.lower(),))
-			bookId_rst = cursor.fetchone()
-			if not bookId_rst:
+			bookId = bookCodeDict.get(book.lower())
+			if not bookId:
 				return '{"success":false, "message":"Invalid book code, '+book+'. The 3 letter code expected."}'
-			bookId = bookId_rst[0]
-			cursor.execute(sql.SQL("SELECT s.token, t.translation, t.senses, l.project_id FROM {} s \
-				LEFT JOIN translations t ON s.token = t.token \
-				LEFT JOIN translation_projects_look_up l ON t.translation_id = l.translation_id \
-				where s.book_id=%s;").format(sql.Identifier(tablename)), (bookId,))
+			cursor.execute(tokenQuery, (projectId, bookId))
 			tokens = cursor.fetchall()
 			if len(tokens)==0:
 				try:
-					languageCode = source_table.split('_')[0]
-					version = '_'.join(source_table.split('_')[1:3])
+					languageCode, version = splitBibleTableName(source_table)
 					phrases.tokenize(connection, languageCode.lower(), version.lower() , bookId)
-					cursor.execute(sql.SQL("SELECT s.token, t.translation, t.senses, l.project_id FROM {} s \
-						LEFT JOIN translations t ON s.token = t.token \
-						LEFT JOIN translation_projects_look_up l ON t.translation_id = l.translation_id \
-						where s.book_id=%s;").format(sql.Identifier(tablename)), (bookId,))
+					cursor.execute(tokenQuery, (projectId, bookId))
 					tokens = cursor.fetchall()
 				except Exception as ex:
 					log.exception(ex)
@@ -1294,21 +1389,21 @@ def getTokenTranslationList(projectId):
 			for item in tokens:
 				if only_words and " " in item[0]:
 					continue
-				if item[3] == projectId:
+				# the join only gives the project id to the tokens with a translation in the project
+				if item[3] is not None:
 					senses = None
 					if item[2]:
 						senses = item[2].replace('|',',')
 						if senses[-1] == ',':
 							senses = senses[:-1]
-					this_book_token_List[item[0]] = [item[1], senses]
+					this_book_token_List[item[0]] = [item[0], item[1], senses]
 				elif item[0] not in this_book_token_List:
-					this_book_token_List[item[0]] = [None, None]
-			for key in this_book_token_List:
-				if key not in tokenList:
-					tokenList[key] = this_book_token_List[key]
+					this_book_token_List[item[0]] = [item[0], None, None]
+			# the rows are kept in their output form, so the result is the values in first seen order
+			for key, row in this_book_token_List.items():
+				tokenList.setdefault(key, row)
 		cursor.close()
-		result_list = [[key]+tokenList[key] for key in tokenList]
-		jsonOut = json.dumps(result_list)
+		jsonOut = srsly.json_dumps(list(tokenList.values()))
 		return jsonOut
 	except Exception as e:
 		print(e)
@@ -1328,6 +1423,15 @@ def getConcordanceList(db_data):
 		concordance.append(obj)
 	return concordance
 
+# the concordance queries are built once, the token and book are passed as parameters
+# instead of being pasted into a new query text for every request
+concordanceBookQuery = sql.SQL("select bb.book_code, bb.book_name, l.chapter, l.verse, b.verse from {} b \
+	left join bcv_map l on b.ref_id=l.ref_id left join bible_books_look_up bb on l.book=bb.book_id \
+		where b.verse like %s and bb.book_code=%s order by l.ref_id")
+concordanceOtherBooksQuery = sql.SQL("select bb.book_code, bb.book_name, l.chapter, l.verse, b.verse from {} b \
+	left join bcv_map l on b.ref_id=l.ref_id left join bible_books_look_up bb on l.book=bb.book_id \
+		where b.verse like %s and bb.book_code!=%s order by l.ref_id \
+			limit 100")
 
 @app.route("/v1/concordances/<sourceId>/<book>/<token>", methods=["GET"])
 def generateConcordances(sourceId, book, token):
@@ -1335,16 +1439,12 @@ def generateConcordances(sourceId, book, token):
 	cursor = connection.cursor()
 	book = book.lower()
 	cursor.execute("select table_name from sources where source_id=%s", (sourceId,))
-	tablename = cursor.fetchone()[0]+"_cleaned"
+	tablename = sql.Identifier(cursor.fetchone()[0]+"_cleaned")
+	pattern = '%' + token + '%'
 	# try:
-	cursor.execute("select bb.book_code, bb.book_name, l.chapter, l.verse, b.verse from " + tablename + " b \
-	left join bcv_map l on b.ref_id=l.ref_id left join bible_books_look_up bb on l.book=bb.book_id \
-		where b.verse like '%" + token + "%' and bb.book_code='" + book +"' order by l.ref_id")
+	cursor.execute(concordanceBookQuery.format(tablename), (pattern, book))
 	book_concordance = getConcordanceList(cursor.fetchall())
-	cursor.execute("select bb.book_code, bb.book_name, l.chapter, l.verse, b.verse from " + tablename + " b \
-	left join bcv_map l on b.ref_id=l.ref_id left join bible_books_look_up bb on l.book=bb.book_id \
-		where b.verse like '%" + token + "%' and bb.book_code!='" + book +"' order by l.ref_id \
-			limit 100")
+	cursor.execute(concordanceOtherBooksQuery.format(tablename), (pattern, book))
 	all_books_concordance = getConcordanceList(cursor.fetchall())
 	return json.dumps({
 		book:book_concordance,
@@ -1418,29 +1518,34 @@ def getContentDetails():
 	return json.dumps(allContentTypeData)
 
 
+# the punctuations and digits are only deleted, str.translate does that without a regex
+punctuationsTable = str.maketrans('', '', '!"#$%&\\\'()*+,./:;<=>?@[]^_`{|}~”“‘’।0123456789')
+draftPunctuationsPattern = re.compile(r'([!\"#$%&\\\'\(\)\*\+,\.\/:;<=>\?\@\[\]^_`{|\}~\”\“\‘\’।])')
+
 def parsePunctuations(text):
-	content = re.sub(r'([!\"#$%&\\\'\(\)\*\+,\.\/:;<=>\?\@\[\]^_`{|\}~\”\“\‘\’।0123456789])',"",text)
+	content = text.translate(punctuationsTable)
 	return content
 
 def parsePunctuationsForDraft(text):
-	content = re.sub(r'([!\"#$%&\\\'\(\)\*\+,\.\/:;<=>\?\@\[\]^_`{|\}~\”\“\‘\’।])',r" \1",text)
+	content = draftPunctuationsPattern.sub(r" \1",text)
 	return content
 
+# verse number formats in the parsed usfm: normal (12), split (12a, 12b) and merged (12-14)
+normalVersePattern = re.compile(r'\d+$')
+splitVersePattern = re.compile(r'(\d+)(\w)$')
+mergedVersePattern = re.compile(r'(\d+)-(\d+)$')
+
 def parseDataForDBInsert(usfmData):
-	connection = get_db()
-	normalVersePattern = re.compile(r'\d+$')
-	splitVersePattern = re.compile(r'(\d+)(\w)$')
-	mergedVersePattern = re.compile(r'(\d+)-(\d+)$')
-	cursor = connection.cursor()
-	cursor.execute("select book_id, book_code from bible_books_look_up")
-	bookIdDict = {v.lower():k for k,v in cursor.fetchall()}
+	bookIdDict = getBibleBookCodes()
 	bookName = usfmData["book"]["bookCode"].lower()
 	chapterData = usfmData["chapters"]
 	dbInsertData = []
-	verseContent = []
 	bookId = bookIdDict[bookName]
+	# ref_id is bbbcccvvv, the book and chapter part only changes once per chapter
+	bookRefId = int(bookId) * 1000000
 	for chapter in chapterData:
 		chapterNumber = chapter["chapterNumber"]
+		chapterRefId = bookRefId + int(chapterNumber) * 1000
 		verseData = chapter["contents"]
 		for content in verseData:
 			crossRefs = ""
@@ -1448,54 +1553,45 @@ def parseDataForDBInsert(usfmData):
 			verseNumber = content.get('verseNumber',"").strip() if isinstance(content, dict) else ""
 			if not verseNumber:
 				# not a verse
-				pass
-			if normalVersePattern.match(verseNumber):
+				continue
+			# each pattern is matched at most once, the match objects are reused below
+			isNormalVerse = normalVersePattern.match(verseNumber)
+			splitVerseMatch = None if isNormalVerse else splitVersePattern.match(verseNumber)
+			mergedVerseMatch = None if isNormalVerse or splitVerseMatch else mergedVersePattern.match(verseNumber)
+			if isNormalVerse:
 				verseText = content["verseText"]
 				dbVerseText = verseText
-				bcv = int(str(bookId).zfill(3) + str(chapterNumber).zfill(3) \
-					+ str(verseNumber).zfill(3))
-				ref_id = int(bcv)
+				ref_id = chapterRefId + int(verseNumber)
 				dbInsertData.append((ref_id, dbVerseText, crossRefs, footNotes))
-				verseContent.append(verseText)
-			elif splitVersePattern.match(verseNumber):
+			elif splitVerseMatch:
 				## combine split verses and use the whole number verseNumber
-				matchObj = splitVersePattern.match(verseNumber)
+				matchObj = splitVerseMatch
 				postScript = matchObj.group(2)
 				verseNumber = matchObj.group(1)
 				if postScript == 'a':
 					verseText = content['verseText']
 					dbVerseText = verseText
-					bcv = int(str(bookId).zfill(3) + str(chapterNumber).zfill(3) \
-						+ str(verseNumber).zfill(3))
-					ref_id = int(bcv)
+					ref_id = chapterRefId + int(verseNumber)
 					dbInsertData.append((ref_id, dbVerseText, crossRefs, footNotes))
-					verseContent.append(verseText)
 				else:
 					prevdbInsertData = dbInsertData[-1]
 
 					verseText = prevdbInsertData[1] + ' '+ content['verseText']
 					dbVerseText = verseText
 					dbInsertData[-1] = (prevdbInsertData[0], dbVerseText, prevdbInsertData[2],prevdbInsertData[3])
-					verseContent[-1] = verseText
-			elif mergedVersePattern.match(verseNumber):
+			elif mergedVerseMatch:
 				## keep the whole text in first verseNumber of merged verses
 				verseText = content['verseText']
 				dbVerseText = verseText
-				matchObj = mergedVersePattern.match(verseNumber)
+				matchObj = mergedVerseMatch
 				verseNumber = matchObj.group(1)
 				verseNumberend = matchObj.group(2)
-				bcv = int(str(bookId).zfill(3) + str(chapterNumber).zfill(3) \
-					+ str(verseNumber).zfill(3))
-				ref_id = int(bcv)
+				ref_id = chapterRefId + int(verseNumber)
 				dbInsertData.append((ref_id, dbVerseText, crossRefs, footNotes))
-				verseContent.append(verseText)
 				## add empty text in the rest of the verseNumber range
 				for vnum in range(int(verseNumber)+1, int(verseNumberend)+1):
-					bcv = int(str(bookId).zfill(3) + str(chapterNumber).zfill(3) \
-						+ str(vnum).zfill(3))
-					ref_id = int(bcv)
+					ref_id = chapterRefId + vnum
 					dbInsertData.append((ref_id, "", "", ""))
-					verseContent.append('')
 
 			else:
 				log.info("Unrecognized pattern in %s chapter %s verse %s",bookName, chapterNumber, verseNumber)
@@ -1575,7 +1671,8 @@ def createBibleSource():
 def uploadSource():
 	try:
 		log.info("Starting uploadSource")
-		req = request.get_json(True)
+		# the whole book comes in the request, parse it with the faster json parser
+		req = srsly.json_loads(request.get_data(as_text=True))
 		sourceId = req["sourceId"]
 		wholeUsfmText = req["wholeUsfmText"]
 		parsedUsfmText = req["parsedUsfmText"]
@@ -1591,9 +1688,9 @@ def uploadSource():
 			log.warning("'book' not found in parsedUsfmText")
 			return '{"success":false, "message":"parsedUsfmText not of the expected format"}'
 		bookCode = parsedUsfmText["book"]["bookCode"].lower()
-		cursor.execute("select book_id from bible_books_look_up where book_code=%s",(bookCode,))
-		bookId = cursor.fetchone()[0]
-		cursor.execute(sql.SQL("select * from {} where book_id=%s").format(sql.Identifier(bibleTable)),(bookId,))
+		bookId = getBibleBookCodes()[bookCode]
+		# only checks that the book is there, without reading its usfm and json
+		cursor.execute(sql.SQL("select 1 from {} where book_id=%s limit 1").format(sql.Identifier(bibleTable)),(bookId,))
 		rst = cursor.fetchone()
 		cursor.close()
 		if rst:
@@ -1602,15 +1699,14 @@ def uploadSource():
 		parsedDbData = parseDataForDBInsert(parsedUsfmText)
 
 		cleanTableName = bibleTable + "_cleaned"
-		print(cleanTableName)
 		cursor = connection.cursor()
 		execute_values(cursor,sql.SQL('insert into {} (ref_id, verse, cross_reference, foot_notes) values %s').format(sql.Identifier(cleanTableName)),
 			parsedDbData)
-		print("added in ",cleanTableName)
-		print("About to insert to ",bibleTable)
+		log.debug("Added %s verses in %s", len(parsedDbData), cleanTableName)
 		usfmJson = str(json.dumps(parsedUsfmText))
 		cursor.execute(sql.SQL('insert into {} (book_id,usfm_text,json_text) values (%s,%s,%s)').format(sql.Identifier(bibleTable)), (bookId, wholeUsfmText,usfmJson,))
-		print("Added to ",bibleTable)
+		# committed with the verses, it tells the cached phrases of the source that the text has changed
+		cursor.execute("update sources set text_version=text_version+1 where source_id=%s", (sourceId,))
 		connection.commit()
 		cursor.close()
 		log.info("Inserted %s into database",bookCode)
@@ -1683,19 +1779,15 @@ def getTransaltedTokensInfo():
 		userId = cursor.fetchone()[0]
 		cursor.execute("select project_id from autographamt_assignments where user_id=%s", (userId,))
 		projectIds = [p[0] for p in cursor.fetchall()]
-		translationInfo = []
-		for p_id in projectIds:
-			cursor.execute("select distinct p.project_id, p.project_name, p.status from translation_projects_look_up \
-				t left join autographamt_projects p on t.project_id=p.project_id where p.project_id=%s", \
-					(p_id,))
-			rst = cursor.fetchall()
-			if rst:
-				for projectId, projectName, status in rst:
-					translationInfo.append({
-						"projectId": projectId,
-						"projectName": projectName,
-						"projectActive":status
-					})
+		# the assigned projects that have translations, fetched together instead of one query per project
+		cursor.execute("select distinct p.project_id, p.project_name, p.status from translation_projects_look_up \
+			t left join autographamt_projects p on t.project_id=p.project_id where p.project_id = ANY(%s)", \
+				(projectIds,))
+		translationInfo = [{
+				"projectId": projectId,
+				"projectName": projectName,
+				"projectActive":status
+			} for projectId, projectName, status in cursor.fetchall()]
 		cursor.close()
 		return json.dumps(translationInfo)
 	except Exception as ex:
@@ -1721,18 +1813,13 @@ def getTranslatedBooks(sourceId, targetId):
 
 	cursor.execute(sql.SQL("select b.book_code, t.token from {} t left join bible_books_look_up b on t.book_id=b.book_id").format(sql.Identifier(tableName)))
 	rstAllTokens = cursor.fetchall()
-	bookWiseTokens = {}
+	bookWiseTokens = defaultdict(list)
 	for bookCode, token in rstAllTokens:
-		if bookCode not in bookWiseTokens:
-			bookWiseTokens[bookCode] = [token]
-		else:
-			# temp = bookWiseTokens[bookCode]
-			bookWiseTokens[bookCode] = bookWiseTokens[bookCode] + [token]
-			# bookWiseTokens[bookCode] = temp
+		bookWiseTokens[bookCode].append(token)
 	translatedBooks = []
-	for key in bookWiseTokens.keys():
-		checkCommonTokens = set(tokenList) & set(bookWiseTokens[key])
-		if checkCommonTokens:
+	tokenSet = set(tokenList)
+	for key, bookTokens in bookWiseTokens.items():
+		if not tokenSet.isdisjoint(bookTokens):
 			translatedBooks.append(key)
 	return json.dumps(translatedBooks)
 
@@ -1777,6 +1864,89 @@ def getTranslatedBooks(sourceId, targetId):
 #         })
 
 
+# patterns used by downloadDraft, compiled once instead of on every request and every line
+usfmMarker = re.compile(r'\\\w+\d?\*?\s?')
+nonLangComponentsTwoSpaces = re.compile(r'\s[!"#$%&\\\'()*+,./:;<=>?@\[\]^_`{|\}~”“‘’।]\s')
+nonLangComponentsTrailingSpace = re.compile(r'[!"#$%&\\\'()*+,./:;<=>?@\[\]^_`{|\}~”“‘’।]\s')
+nonLangComponentsFrontSpace = re.compile(r'\s[!"#$%&\\\'()*+,./:;<=>?@\[\]^_`{|\}~”“‘’।]')
+nonLangComponents = re.compile(r'[!"#$%&\\\'()*+,./:;<=>?@\[\]^_`{|\}~”“‘’।]')
+multipleSpaces = re.compile(r'\s+')
+twoSpacesPlaceholder = re.compile(r' uuuQQQuuu ')
+trailingSpacePlaceholder = re.compile(r' QQQuuu ')
+frontSpacePlaceholder = re.compile(r' uuuQQQ ')
+nonLangPlaceholder = re.compile(r' QQQ ')
+
+def extractNonLangComponents(pattern, placeholder, text, comps):
+	'''
+	Replace the non language components matched by the pattern with the placeholder, adding them
+	to comps, in a single scan of the text instead of a findall and a sub over it.
+	'''
+	def replace(match):
+		comps.append(match.group())
+		return placeholder
+	return pattern.sub(replace, text)
+
+def restoreNonLangComponents(placeholder, line, comps, fmt):
+	'''
+	Put the non language components back in place of their placeholders, in the order they
+	were taken out, in a single sweep over the line instead of one search per component.
+	'''
+	if not comps:
+		return line
+	remaining = iter(comps)
+	return placeholder.sub(lambda match: fmt % next(remaining), line, count=len(comps))
+
+def translateUsfmBooks(rows, phraseTranslations):
+	'''
+	Generator over the (usfm_text, book_code) rows of the source, yielding the translated
+	usfm of one book at a time, so only the book being translated is held in memory.
+	'''
+	for usfm_text, book in rows:
+		usfmLineList = []
+		for line in usfm_text.split('\n'):
+			if not line or line.isspace():
+				# nothing to translate, the line would come out empty anyway
+				usfmLineList.append('')
+				continue
+			usfmWordsList = []
+			nonLangCompsTwoSpaces = []
+			nonLangCompsTrailingSpace = []
+			nonLangCompsFrontSpace = []
+			nonLangComps = []
+			markers_in_line = usfmMarker.findall(line)
+			translated_seq = []
+			for word_seq in usfmMarker.split(line):
+				if not word_seq or word_seq.isspace():
+					# the gaps before and between markers have no text, skip the regex passes
+					continue
+				clean_word_seq = extractNonLangComponents(nonLangComponentsTwoSpaces, ' uuuQQQuuu ', word_seq, nonLangCompsTwoSpaces)
+				clean_word_seq = extractNonLangComponents(nonLangComponentsTrailingSpace, ' QQQuuu ', clean_word_seq, nonLangCompsTrailingSpace)
+				clean_word_seq = extractNonLangComponents(nonLangComponentsFrontSpace, ' uuuQQQ ', clean_word_seq, nonLangCompsFrontSpace)
+				clean_word_seq = extractNonLangComponents(nonLangComponents, ' QQQ ', clean_word_seq, nonLangComps)
+				# str.isspace is the same test as matching \s+$, without running a regex per sequence
+				if clean_word_seq!='' and not clean_word_seq.isspace():
+					translated_seq.append(phrases.translateText( clean_word_seq, phraseTranslations ))
+
+			# markers and translated sequences alternate, any extra sequences follow the last marker
+			markerCount = len(markers_in_line)
+			translatedCount = len(translated_seq)
+			for i,marker in enumerate(markers_in_line):
+				usfmWordsList.append(marker)
+				if i<translatedCount:
+					usfmWordsList.append(translated_seq[i])
+			if markerCount<translatedCount:
+				usfmWordsList += translated_seq[markerCount:]
+			outputLine = " ".join(usfmWordsList)
+			outputLine = restoreNonLangComponents(twoSpacesPlaceholder, outputLine, nonLangCompsTwoSpaces, " %s ")
+			outputLine = restoreNonLangComponents(trailingSpacePlaceholder, outputLine, nonLangCompsTrailingSpace, "%s ")
+			outputLine = restoreNonLangComponents(frontSpacePlaceholder, outputLine, nonLangCompsFrontSpace, " %s")
+			outputLine = restoreNonLangComponents(nonLangPlaceholder, outputLine, nonLangComps, "%s")
+			outputLine = multipleSpaces.sub(' ',outputLine)
+			# print(outputLine)
+
+			usfmLineList.append(outputLine)
+		yield book, "\n".join(usfmLineList)
+
 @app.route("/v1/downloaddraft", methods=["POST"])
 @check_token
 def downloadDraft():
@@ -1786,92 +1956,34 @@ def downloadDraft():
 	try:
 		connection = get_db()
 		cursor = connection.cursor()
-		cursor.execute("select source_id from autographamt_projects where project_id=%s", (projectId,))
-		sourceId = cursor.fetchone()[0]
-		usfmMarker = re.compile(r'\\\w+\d?\*?\s?')
-		nonLangComponentsTwoSpaces = re.compile(r'\s[!"#$%&\\\'()*+,./:;<=>?@\[\]^_`{|\}~”“‘’।]\s')
-		nonLangComponentsTrailingSpace = re.compile(r'[!"#$%&\\\'()*+,./:;<=>?@\[\]^_`{|\}~”“‘’।]\s')
-		nonLangComponentsFrontSpace = re.compile(r'\s[!"#$%&\\\'()*+,./:;<=>?@\[\]^_`{|\}~”“‘’।]')
-		nonLangComponents = re.compile(r'[!"#$%&\\\'()*+,./:;<=>?@\[\]^_`{|\}~”“‘’।]')
-
-		if phrases.loadPhraseTranslations(connection, projectId):
-
-			cursor.execute("select table_name from sources where source_id=%s", (sourceId,))
-			tablename = cursor.fetchone()[0]
+		cursor.execute("select s.table_name from autographamt_projects p left join sources s \
+			on p.source_id=s.source_id where p.project_id=%s", (projectId,))
+		tablename = cursor.fetchone()[0]
+
+		phraseTranslations = phrases.loadPhraseTranslations(connection, projectId)
+		if phraseTranslations:
+
 			# bookList = ",".join(bookList)
-			cursor.execute(sql.SQL("select usfm_text,book_code from {} bb \
-					left join bible_books_look_up bl on bb.book_id=bl.book_id \
-					where bl.book_code = ANY(%s::text[])").format(sql.Identifier(tablename)),('{'+",".join(bookList)+'}',))
-			source_rst = cursor.fetchall()
-			# print(source_rst)
-
-			# usfmText = source_rst[0]['usfm'][bookCode]
-			finalDraftDict = {}
-			for row in source_rst:
-				usfm_text = row[0]
-				book = row[1]
-				usfmLineList = []
-				for line in usfm_text.split('\n'):
-					usfmWordsList = []
-					nonLangCompsTwoSpaces = []
-					nonLangCompsTrailingSpace = []
-					nonLangCompsFrontSpace = []
-					nonLangComps = []
-					markers_in_line = re.findall(usfmMarker,line)
-					translated_seq = []
-					for word_seq in re.split(usfmMarker,line):
-						nonLangCompsTwoSpaces += re.findall(nonLangComponentsTwoSpaces,word_seq)
-						clean_word_seq = re.sub(nonLangComponentsTwoSpaces,' uuuQQQuuu ',word_seq)
-						nonLangCompsTrailingSpace += re.findall(nonLangComponentsTrailingSpace,clean_word_seq)
-						clean_word_seq = re.sub(nonLangComponentsTrailingSpace,' QQQuuu ',clean_word_seq)
-						nonLangCompsFrontSpace += re.findall(nonLangComponentsFrontSpace,clean_word_seq)
-						clean_word_seq = re.sub(nonLangComponentsFrontSpace,' uuuQQQ ',clean_word_seq)
-						nonLangComps += re.findall(nonLangComponents,clean_word_seq)
-						clean_word_seq = re.sub(nonLangComponents,' QQQ ',clean_word_seq)
-						if not re.match(r'\s+$',clean_word_seq) and clean_word_seq!='':
-							translated_seq.append(phrases.translateText( clean_word_seq ))
-
-					for i,marker in enumerate(markers_in_line):
-						usfmWordsList.append(marker)
-						if i<len(translated_seq):
-							usfmWordsList.append(translated_seq[i])
-					if i+1<len(translated_seq):
-						usfmWordsList += translated_seq[i+1:]
-					outputLine = " ".join(usfmWordsList)
-					if 'bdit' in outputLine:
-						print('translated_seq:',translated_seq)
-						print(nonLangComps,nonLangCompsFrontSpace,nonLangCompsTrailingSpace,nonLangCompsTwoSpaces)
-					for comp in nonLangCompsTwoSpaces:
-						comp = comp.replace("\\", '\\\\')
-						outputLine = re.sub(r' uuuQQQuuu '," "+comp+" ",outputLine,1)
-					for comp in nonLangCompsTrailingSpace:
-						comp = comp.replace("\\", '\\\\')
-						outputLine = re.sub(r' QQQuuu ',comp+" ",outputLine,1)
-					for comp in nonLangCompsFrontSpace:
-						comp = comp.replace("\\", '\\\\')
-						outputLine = re.sub(r' uuuQQQ '," "+comp,outputLine,1)
-					for comp in nonLangComps:
-						comp = comp.replace("\\", '\\\\')
-						outputLine = re.sub(r' QQQ ',comp,outputLine,1)
-					outputLine = re.sub(r'\s+',' ',outputLine)
-					# print(outputLine)
-
-					usfmLineList.append(outputLine)
-				translatedUsfmText = "\n".join(usfmLineList)
-				finalDraftDict[book] = translatedUsfmText
+			# a server side cursor fetches the usfm of one book at a time, so the source
+			# books are not all read into memory before they are translated
+			bookCursor = connection.cursor(name='draft_books')
+			bookCursor.itersize = 1
+			try:
+				bookCursor.execute(sql.SQL("select usfm_text,book_code from {} bb \
+						left join bible_books_look_up bl on bb.book_id=bl.book_id \
+						where bl.book_code = ANY(%s::text[])").format(sql.Identifier(tablename)),('{'+",".join(bookList)+'}',))
+				finalDraftDict = {}
+				for book, translatedUsfmText in translateUsfmBooks(bookCursor, phraseTranslations):
+					finalDraftDict[book] = translatedUsfmText
+			finally:
+				bookCursor.close()
 			return json.dumps({
 				"translatedUsfmText": finalDraftDict
 			})
 		else:
 			return '{"success": false, "message":"No translation available"}'
 	except Exception as e:
-		traceback.print_exc()
-		print("line:",line)
-		print(marker,'of',markers_in_line)
-		print('usfmWordsList:',usfmWordsList)
-		print('translated_seq:',translated_seq)
-		print('word_seq:',word_seq)
-		print('clean_word_seq:',clean_word_seq)
+		log.exception("Exception in downloadDraft: %s", e)
 		return json.dumps({'success':False, 'message':"Server error"})
 
 
@@ -1916,12 +2028,7 @@ def getTranslatedWords(sourceId, targetLanguageId, token):
 
 	if rst:
 		translation, senses = rst
-		print(senses)
-		if senses != None:
-			if senses.strip() == "":
-				senses = []
-			else:
-				senses = senses.split('|')
+		senses = convertStringToList(senses, skipBlank=True)
 		return json.dumps({
 			"translation":translation,
 			"senses":senses
@@ -1937,23 +2044,15 @@ def getAllTranslatedWords(sourceId, targetLanguageId):
 	cursor.execute("select token,translation, senses from translations where source_id=%s \
 		and target_id=%s", (sourceId, targetLanguageId))
 	rst = cursor.fetchall()
-	print(rst)
 
 	if rst:
-		result = []
-		for item in rst:
-			token,translation, senses = item
-			print(senses)
-			if senses.strip() == "":
-				senses = []
-			else:
-				senses = senses.split('|')
-			result.append({
+		# the result is built in one pass over the fetched rows
+		result = [{
 				"token": token,
 				"translation":translation,
-				"senses":senses
-			})
-		return json.dumps(result)
+				"senses":convertStringToList(senses, skipBlank=True)
+			} for token, translation, senses in rst]
+		return srsly.json_dumps(result)
 	else:
 		return '{"success": false, "message":"No Token Translations or senses available for this language pair"}'
 
@@ -1974,33 +2073,33 @@ def getbookText(sourceid, outputtype, bookid):
 			return json.dumps({'success':False,'message':'Source not present.'})
 
 		tableName = rst[0]
+		# only the requested format is read, the other one is as large and would be thrown away
+		if outputtype == 'usfm':
+			contentColumn = sql.Identifier('usfm_text')
+		elif outputtype == 'json':
+			contentColumn = sql.Identifier('json_text')
+		else:
+			return json.dumps({'success':False,'message':'Unsupported type. Use "usfm" or "json"'})
 		returnObj = {}
 		if bookid:
-			cursor.execute(sql.SQL("select usfm_text, json_text from {} where book_id=%s").format(sql.Identifier(tableName)),(bookid,))
+			cursor.execute(sql.SQL("select {} from {} where book_id=%s").format(contentColumn, sql.Identifier(tableName)),(bookid,))
 			sourceContent = cursor.fetchone()
 			bookCode = (bookIdDict[int(bookid)]).lower()
 			if not sourceContent:
 				return json.dumps({'success':False,'message':'Book has not been uploaded in the source.'})
-			if outputtype == 'usfm':
-				returnObj[bookCode] = sourceContent[0]
-			elif outputtype == 'json':
-				returnObj[bookCode] = sourceContent[1]
-			else:
-				return json.dumps({'success':False,'message':'Unsupported type. Use "usfm" or "json"'})
+			returnObj[bookCode] = sourceContent[0]
 		else:
-			cursor.execute(sql.SQL("select book_id,usfm_text, json_text from {}").format(sql.Identifier(tableName)))
+			cursor.execute(sql.SQL("select book_id, {} from {}").format(contentColumn, sql.Identifier(tableName)))
 			sourceContents = cursor.fetchall()
 			if not sourceContents:
 				return json.dumps({'success':False,'message':'Book has not been uploaded in the source.'})
 			if outputtype == 'usfm':
 				for row in sourceContents:
 					returnObj[row[0]] = row[1]
-			elif outputtype == 'json':
+			else:
 				for row in sourceContents:
 					bookCode = (bookIdDict[int(row[0])]).lower()
-					returnObj[bookCode] = row[2]
-			else:
-				return json.dumps({'success':False,'message':'Unsupported type. Use "usfm" or "json"'})
+					returnObj[bookCode] = row[1]
 
 		return json.dumps(returnObj)
 	except Exception as e:
@@ -2072,7 +2171,7 @@ def removeUser():
 			cursor.execute("select user_id from autographamt_users where email_id=%s",(userEmail,))
 			userId = cursor.fetchone()
 			if userId:
-				status = json.loads(deleteUser(userId))
+				status = deleteUser(userId)
 				message += status['message']
 				success = status['success']
 			else:
@@ -2135,7 +2234,7 @@ def removeOrg():
 			cursor.execute("select organisation_id from autographamt_organisations where organisation_id=%s",(orgId,))
 			org = cursor.fetchone()
 			if org:
-				status = json.loads(deleteOrganisation(orgId))
+				status = deleteOrganisation(orgId)
 				message += status['message']
 				success = status['success']
 			else:
@@ -2197,7 +2296,7 @@ def removeProject():
 				cursor.execute("select * from autographamt_projects where project_id=%s",(projectId,))
 				project = cursor.fetchone()
 				if project:
-					status = json.loads(deleteProject(projectId))
+					status = deleteProject(projectId)
 					message += status["message"]
 					success = status["success"]
 				else:
@@ -2212,7 +2311,7 @@ def removeProject():
 				cursor.execute("select * from autographamt_projects where project_id=%s and organisation_id= ANY(%s::int[])",(projectId,'{'+','.join(str(n) for n in orgIds)+'}',))
 				project = cursor.fetchone()
 				if project:
-					status = json.loads(deleteProject(projectId))
+					status = deleteProject(projectId)
 					message += status["message"]
 					success = status["success"]
 				else:
@@ -2329,18 +2428,18 @@ def deleteUser(userId):
 		role = cursor.fetchone()
 		if role==3:
 			message += "Super admin user cannot be removed."
-			return json.dumps({'success':success,'message':message})
+			return {'success':success,'message':message}
 		elif role==2:
 			cursor.execute("select organisation_id from autographamt_organisations where user_id=%s",(userId,))
 			orgIds = cursor.fetchall()
 			if len(orgIds)>0:
 				message = "Organisation admin cannot be deleted. Delete the organisation first."
-				return json.dumps({'success':success,'message':message})
+				return {'success':success,'message':message}
 		cursor.execute("select * from autographamt_assignments where user_id=%s",(userId,))
 		rst = cursor.fetchone()
 		if rst:
 			message += "User has translation assignments."
-			return json.dumps({'success':success,'message':message})
+			return {'success':success,'message':message}
 		cursor.execute("update autographamt_users set status=false where user_id=%s",(userId,))
 		connection.commit()
 		success = True
@@ -2348,7 +2447,7 @@ def deleteUser(userId):
 	except Exception as e:
 		print(e)
 		message += "Server error."
-	return json.dumps({'success':success,'message':message})
+	return {'success':success,'message':message}
 
 
 
@@ -2361,10 +2460,10 @@ def deleteOrganisation(orgId):
 		cursor.execute("select project_id from autographamt_projects where organisation_id=%s",(orgId,))
 		projectIds = cursor.fetchall()
 		for projectId in projectIds:
-			status = json.loads(deleteProject(projectId))
+			status = deleteProject(projectId)
 			if status["success"] == False:
 				message = status["message"]
-				return json.dumps({'success':success,'message':message})
+				return {'success':success,'message':message}
 		cursor.execute("update autographamt_organisations set status=false where organisation_id=%s",(orgId,))
 		success = True
 		message = "Deactivated organization and its projects."
@@ -2372,7 +2471,7 @@ def deleteOrganisation(orgId):
 	except Exception as e:
 		print(e)
 		message = "server error"
-	return json.dumps({'success':success,'message':message})
+	return {'success':success,'message':message}
 
 
 def deleteProject(projectId):
@@ -2388,7 +2487,7 @@ def deleteProject(projectId):
 	except Exception as e:
 		print(e)
 		message = "Server error"
-	return json.dumps({'success':success,'message':message})
+	return {'success':success,'message':message}
 
 
 def delete_source(source_id):
@@ -2404,7 +2503,6 @@ def delete_source(source_id):
 			if status==True:
 				cursor.execute("select project_name from autographamt_projects where source_id=%s and status=true",(source_id,))
 				rows = cursor.fetchall()
-				print(rows)
 				if not rows:
 					cursor.execute("update sources set status=false where source_id=%s",(source_id,))
 					connection.commit()
@@ -2499,27 +2597,24 @@ def biblePattern(*argv):
 	}
 	return pattern
 
-def sortByLanguageObject(languageObject,version):
-	'''Sort the list of bible versions by language format by language object.'''
-	for index,item in enumerate(languageObject):
-		if item['language'] == version["language"]["name"]:
-			languageObject[index]["languageVersions"].append(version)
-			break
-	else:
-		languageObject.append({"language": version["language"]["name"],"languageVersions": [version]})
-	return languageObject
-
-def sortByLanguageName(languageObject,version):
-	'''Sort the list of bible versions by language format by language name.'''
-	for index,item in enumerate(languageObject):
-		if item["language"]["name"] == version["language"]["name"]:
+def groupByLanguage(versions, languageObject):
+	'''
+	Group the list of bible versions by language name, in the order the languages are first seen.
+	With languageObject each group carries the language object, which is taken out of its versions,
+	otherwise just the language name. The group of a language is found with one dict lookup,
+	instead of scanning the groups built so far for every version.
+	'''
+	groups = {}
+	for version in versions:
+		name = version["language"]["name"]
+		group = groups.get(name)
+		if group is None:
+			group = groups[name] = {"language": version["language"] if languageObject else name,
+				"languageVersions": []}
+		if languageObject:
 			version.pop("language")
-			languageObject[index]["languageVersions"].append(version)
-			break
-	else:
-		language = version.pop("language")
-		languageObject.append({"language": language,"languageVersions": [version]})
-	return languageObject
+		group["languageVersions"].append(version)
+	return list(groups.values())
 
 @app.route("/v1/bibles", methods=["GET"])
 def getBibles():
@@ -2570,11 +2665,7 @@ def getBibles():
 			)
 		)
 	cursor.close()
-	sortedList = []
-	if(language and language.lower() == "true"):
-		sortedList = reduce(sortByLanguageName,biblesList,[])
-	else:
-		sortedList = reduce(sortByLanguageObject,biblesList,[])
+	sortedList = groupByLanguage(biblesList, bool(language and language.lower() == "true"))
 	return json.dumps(sortedList)
 
 @app.route("/v1/bibles/languages", methods=["GET"])
@@ -2609,19 +2700,18 @@ def getBibleBooks(sourceId):
 	if not bookLists:
 		return json.dumps({"success": False, "message": "No Books uploaded yet"})
 	booksData = []
-	cursor.execute("select * from bible_books_look_up order by book_id")
 	booksDict = {}
-	for bibleBookID, bibleBookFullName, bibleBookCode in cursor.fetchall():
+	for bibleBookID, bibleBookCode in getBibleBookIds().items():
+		bibleBookFullName = bibleBookNameDict[bibleBookID]
 		booksDict[bibleBookID] = {
 			"bibleBookID":bibleBookID,
 			"abbreviation": bibleBookCode,
 			"bibleBookFullName": bibleBookFullName.capitalize()
 		}
 	for book in bookLists:
-		if book[0] in booksDict:
-			booksData.append(
-				booksDict[book[0]]
-			)
+		bookData = booksDict.get(book[0])
+		if bookData:
+			booksData.append(bookData)
 	bibleBooks = [
 		{
 			"sourceId": sourceId,
@@ -2681,13 +2771,16 @@ def getBible(sourceId, contentFormat):
 			usfm_text[book]=text
 		usfmText = {"sourceId":sourceId,"bibleContent":usfm_text}
 	elif contentFormat.lower() == 'json':
-		cursor.execute( sql.SQL("select l.book_code,b.json_text from {} b \
+		# the books are stored as JSONB already, so take their text form from postgres and
+		# splice it into the response instead of decoding the whole bible into python
+		# objects only to encode it back again. The books are keyed as json.dumps keys a dict: a
+		# book with no code goes under "null", and a code read twice keeps the last text read
+		cursor.execute( sql.SQL("select l.book_code,coalesce(b.json_text::text,'null') from {} b \
 			left join bible_books_look_up l on b.book_id=l.book_id").format(sql.Identifier(rst[0])))
-		bible_data = cursor.fetchall()
-		json_text = {}
-		for book,text in bible_data:
-			json_text[book]=text
-		usfmText = {"sourceId":sourceId,"bibleContent":json_text}
+		bible_data = {("null" if book is None else book):text for book,text in cursor.fetchall()}
+		cursor.close()
+		json_text = ", ".join("%s: %s" % (json.dumps(book), text) for book,text in bible_data.items())
+		return '{"sourceId": %s, "bibleContent": {%s}}' % (json.dumps(sourceId), json_text)
 	else:
 		return '{"success": false, "message":"Invalid Content Type"}'
 	cursor.close()
@@ -2757,8 +2850,7 @@ def getChapter(sourceId,bookCode,chapterId):
 	connection = get_db()
 	cursor = connection.cursor()
 	bookCode=bookCode.lower()
-	cursor.execute("select book_id from bible_books_look_up where book_code=%s", (bookCode.lower(),))
-	bible_book_data = cursor.fetchone()
+	bible_book_data = getBibleBook(bookCode)
 	if not bible_book_data:
 		return '{"success":false, "message":"Invalid book code"}'
 	book_id = bible_book_data[0]
@@ -2813,9 +2905,7 @@ def getBibleVerses(sourceId, biblebookCode, chapterId):
 	try:
 		connection = get_db()
 		cursor = connection.cursor()
-		cursor.execute("select book_id, book_name from bible_books_look_up \
-			where book_code=%s", (biblebookCode.lower(),))
-		bibleBookData = cursor.fetchone()
+		bibleBookData = getBibleBook(biblebookCode)
 		if not bibleBookData:
 			return '{"success":false, "message":"Invalid book code"}'
 		cursor.execute("select table_name from sources where source_id=%s", (sourceId,))
@@ -2826,11 +2916,11 @@ def getBibleVerses(sourceId, biblebookCode, chapterId):
 		endId = int(bibleBookData[0]) * 1000000 + ((int(chapterId) + 1) * 1000)
 		cursor.execute(sql.SQL("select ref_id from {} where ref_id > %s and ref_id < %s order by ref_id").\
 			format(sql.Identifier(tableName[0] + "_cleaned")), [startId, endId])
-		refIdsList = [x[0] for x in cursor.fetchall()]
+		# ref_id is bbbcccvvv, the verse number is the remainder and comes sorted with the ref_ids
 		verseList = []
-		for ref in refIdsList:
-			verseNumber = int(str(ref)[-3:])
-			if verseNumber not in verseList:
+		for (ref,) in cursor.fetchall():
+			verseNumber = ref % 1000
+			if not verseList or verseList[-1] != verseNumber:
 				verseList.append(verseNumber)
 		verses = []
 		for num in verseList:
@@ -2856,9 +2946,7 @@ def getBibleVerseText(sourceId, bibleBookCode, chapterId, verseId):
 	try:
 		connection = get_db()
 		cursor = connection.cursor()
-		cursor.execute("select book_id, book_name from bible_books_look_up \
-			where book_code=%s", (bibleBookCode.lower(),))
-		bibleBookData = cursor.fetchone()
+		bibleBookData = getBibleBook(bibleBookCode)
 		if not bibleBookData:
 			return '{"success":false, "message":"Invalid book code"}'
 		cursor.execute("select table_name from sources where source_id=%s", (sourceId,))
@@ -2866,7 +2954,7 @@ def getBibleVerseText(sourceId, bibleBookCode, chapterId, verseId):
 		if not tableName:
 			return '{"success":false, "message":"Source doesn\'t exist"}'
 		bookId = bibleBookData[0]
-		ref_id = int(str(bookId).zfill(2) + chapterId.zfill(3) + verseId.zfill(3))
+		ref_id = int(bookId) * 1000000 + int(chapterId) * 1000 + int(verseId)
 		cursor.execute(sql.SQL("select verse from {} where ref_id=%s").\
 			format(sql.Identifier(tableName[0] + "_cleaned")), [ref_id])
 		verse = cursor.fetchone()
@@ -2891,13 +2979,11 @@ def getBibleVerses2(sourceId, chapterId):
 	try:
 		connection = get_db()
 		cursor = connection.cursor()
-		try:
-			bookCode, chapterNumber = chapterId.split('.')
-		except:
+		# reject malformed ids with a cheap count before splitting, instead of catching the unpack error
+		if chapterId.count('.') != 1:
 			return '{"success": false, "message":"Invalid Chapter id format."}'
-		cursor.execute("select book_id, book_name from bible_books_look_up \
-			where book_code=%s", (bookCode.lower(),))
-		bibleBookData = cursor.fetchone()
+		bookCode, chapterNumber = chapterId.split('.')
+		bibleBookData = getBibleBook(bookCode)
 		if not bibleBookData:
 			return '{"success":false, "message":"Invalid book code"}'
 		cursor.execute("select table_name from sources where source_id=%s", (sourceId,))
@@ -2908,11 +2994,11 @@ def getBibleVerses2(sourceId, chapterId):
 		endId = int(bibleBookData[0]) * 1000000 + ((int(chapterNumber) + 1) * 1000)
 		cursor.execute(sql.SQL("select ref_id from {} where ref_id > %s and ref_id < %s order by ref_id").\
 			format(sql.Identifier(tableName[0] + "_cleaned")), [startId, endId])
-		refIdsList = [x[0] for x in cursor.fetchall()]
+		# ref_id is bbbcccvvv, the verse number is the remainder and comes sorted with the ref_ids
 		verseList = []
-		for ref in refIdsList:
-			verseNumber = int(str(ref)[-3:])
-			if verseNumber not in verseList:
+		for (ref,) in cursor.fetchall():
+			verseNumber = ref % 1000
+			if not verseList or verseList[-1] != verseNumber:
 				verseList.append(verseNumber)
 		verses = []
 		for num in verseList:
@@ -2938,13 +3024,10 @@ def getBibleVerseText2(sourceId, verseId):
 	try:
 		connection = get_db()
 		cursor = connection.cursor()
-		try:
-			bookCode, chapterNumber, verseNumber = verseId.split('.')
-		except:
+		if verseId.count('.') != 2:
 			return '{"success": false, "message":"Invalid Verse id format."}'
-		cursor.execute("select book_id, book_name from bible_books_look_up \
-			where book_code=%s", (bookCode.lower(),))
-		bibleBookData = cursor.fetchone()
+		bookCode, chapterNumber, verseNumber = verseId.split('.')
+		bibleBookData = getBibleBook(bookCode)
 		if not bibleBookData:
 			return '{"success":false, "message":"Invalid book code"}'
 		cursor.execute("select table_name from sources where source_id=%s", (sourceId,))
@@ -2952,7 +3035,7 @@ def getBibleVerseText2(sourceId, verseId):
 		if not tableName:
 			return '{"success":false, "message":"Source doesn\'t exist"}'
 		bookId = bibleBookData[0]
-		ref_id = int(str(bookId).zfill(2) + chapterNumber.zfill(3) + verseNumber.zfill(3))
+		ref_id = int(bookId) * 1000000 + int(chapterNumber) * 1000 + int(verseNumber)
 		cursor.execute(sql.SQL("select verse from {} where ref_id=%s").\
 			format(sql.Identifier(tableName[0] + "_cleaned")), [ref_id])
 		verse = cursor.fetchone()
@@ -3042,9 +3125,7 @@ def addCommentarySource():
 			cursor.execute('insert into sources (table_name, year, license, content_id, language_id, version_id,status) values \
 				(%s, %s, %s, %s, %s, %s,true)', (tableName, year, license, contentId, languageId,version_id,))
 			#insert commentary data into table
-			commentaryData = []
-			for row in commentary:
-				commentaryData.append((row['bookId'],row['chapter'],row['verse'],row['commentary']))
+			commentaryData = ((row['bookId'],row['chapter'],row['verse'],row['commentary']) for row in commentary)
 			execute_values(cursor,sql.SQL('insert into {} (book_id, chapter, verse, commentary) values %s').format(sql.Identifier(tableName)),
 				commentaryData)
 			connection.commit()
@@ -3106,7 +3187,8 @@ def getBibleCommentaries():
 		commentaries = []
 		authorised = checkAuthorised(cursor,request.args.get('key'))
 		for source_id, code, name,language_code,language,metadata in rst:
-			if metadata and "Copyright" in metadata and metadata["Copyright"]=="True" and not authorised:
+			# authorised users see everything, so the metadata is only looked at for the others
+			if not authorised and metadata and metadata.get("Copyright") == "True":
 				continue
 			commentaries.append({ 'sourceId':source_id,'code':code,'name':name,
 				'languageCode':language_code,'language':language,'metadata':metadata})
@@ -3128,15 +3210,14 @@ def getCommentaryChapter(sourceId,bookCode,chapterId):
 		rst = cursor.fetchone()
 		if not rst:
 			return '{"success":false, "message":"Invalid commentary sourceId"}'
-		if rst[0] and rst[0] =="True":
+		if rst[0] == "True":
 			#If copyright commentary then check if authorised
 			authorised = checkAuthorised(cursor,request.args.get('key'))
 			if not authorised:
 				return '{"success":false, "message":"Not authorised"}'
 		bookCode=bookCode.lower()
 		#Get bible book id
-		cursor.execute("select book_id from bible_books_look_up where book_code=%s", (bookCode.lower(),))
-		bible_book_data = cursor.fetchone()
+		bible_book_data = getBibleBook(bookCode)
 		if not bible_book_data:
 			return '{"success":false, "message":"Invalid book code"}'
 		book_id = bible_book_data[0]
@@ -3213,10 +3294,8 @@ def addDictionarySource():
 			cursor.execute('insert into sources (table_name, year, license, content_id, language_id, version_id,status) values \
 				(%s, %s, %s, %s, %s, %s,true)', (tableName, year, license, contentId, languageId,version_id,))
 			#insert dictionary data into table
-			dictionaryData = []
-			for row in dictionary:
-				dictionaryData.append((row['keyword'], row['wordForms'], row['strongs'], row['definition'], row['translationHelp'], 
-					row['seeAlso'], row['ref'], row['examples']))
+			dictionaryData = ((row['keyword'], row['wordForms'], row['strongs'], row['definition'], row['translationHelp'], 
+					row['seeAlso'], row['ref'], row['examples']) for row in dictionary)
 			execute_values(cursor,sql.SQL('insert into {} (keyword, wordforms, strongs, definition, translationhelp, seealso, \
 				ref, examples) values %s').format(sql.Identifier(tableName)),dictionaryData)
 			connection.commit()
@@ -3276,17 +3355,15 @@ def getDictionaries():
 		traceback.print_exc()
 		return '{"success":false, "message":"%s"}' %(str(ex))
 
-def sortDictionaryByLetter(dictionary,word):
-	'''Sort the words in the dictionary by letter.'''
-	for index,item in enumerate(dictionary):
-		if item["letter"] == word["letter"].upper():
-			word.pop("letter")
-			dictionary[index]["words"].append(word)
-			break
-	else:
-		letter = word.pop("letter").upper()
-		dictionary.append({"letter": letter,"words": [word]})
-	return dictionary
+def groupDictionaryByLetter(words):
+	'''
+	Group the words of the dictionary by their upper cased first letter, in the order of the words.
+	Each letter is looked up in a dict, instead of scanning all the letter groups for every word.
+	'''
+	groups = {}
+	for word in words:
+		groups.setdefault(word["word"][0].upper(), []).append(word)
+	return [{"letter": letter,"words": letterWords} for letter,letterWords in groups.items()]
 
 @app.route("/v1/dictionaries/<sourceId>", methods=["GET"])
 def getDictionaryWords(sourceId):
@@ -3310,10 +3387,10 @@ def getDictionaryWords(sourceId):
 			for word in wordforms.split(","):
 				word=word.strip()
 				if len(word)>0:
-					words.append({"letter":word[0],"wordId":id,"word":word})
+					words.append({"wordId":id,"word":word})
 		# Sort dictionary by word and group by letter
 		words = sorted(words,key=lambda w: w['word'].lower())
-		words = reduce(sortDictionaryByLetter,words,[])
+		words = groupDictionaryByLetter(words)
 		return json.dumps(sorted(words,key=lambda x: x['letter']))
 	except Exception as ex:
 		traceback.print_exc()
@@ -3392,9 +3469,7 @@ def addInfographicSource():
 			cursor.execute('insert into sources (table_name, year, license, content_id, language_id, version_id,metadata,status) \
 				values (%s, %s, %s, %s, %s, %s, %s,true)', (tableName, year, license, contentId, languageId,version_id,metadata))
 			#insert infographic data into table
-			infographicData = []
-			for row in infographics:
-				infographicData.append((row['bookId'], row['title'], row['fileName']))
+			infographicData = ((row['bookId'], row['title'], row['fileName']) for row in infographics)
 			execute_values(cursor,sql.SQL('insert into {} (book_id, title, file_name) values %s').
 				format(sql.Identifier(tableName)),infographicData)
 			connection.commit()
@@ -3571,7 +3646,7 @@ def addBibleVideos():
 			return '{"success": false, "message":"Language code not found"}'
 		cursor.execute("select url from bible_videos")
 		rst=cursor.fetchall()
-		urls = [v [0] for v in rst]
+		urls = {v [0] for v in rst}
 		added = 0
 		videoData = []
 		skipped =[]
@@ -3606,16 +3681,22 @@ def sortVideosByLanguage(languageObject,video):
 
 def sortVideosByBooks(languageObject):
 	'''Sort the list of video's by book code.'''
-	bookObject = {}
+	bookObject = defaultdict(list)
 	for item in languageObject["books"]:
 		book = item.pop("book")
-		if book in bookObject.keys():
-			bookObject[book].append(item)
-		else:
-			bookObject[book]= [item]
+		bookObject[book].append(item)
 	languageObject["books"] = bookObject
 	return languageObject
 
+# book codes that the OT, NT and FB (full bible) video tags expand to, split once at import
+videoBookCodes = {
+	"OT": "gen,exo,lev,num,deu,jos,jdg,rut,1sa,2sa,1ki,2ki,1ch,2ch,ezr,neh,est,job,psa,pro,ecc,sng,isa,\
+jer,lam,ezk,dan,hos,jol,amo,oba,jon,mic,nam,hab,zep,hag,zec,mal".split(","),
+	"NT": "mat,mrk,luk,jhn,act,rom,1co,2co,gal,eph,php,col,1th,2th,1ti,2ti,tit,phm,heb,jas,1pe,2pe,\
+1jn,2jn,3jn,jud,rev".split(","),
+}
+videoBookCodes["FB"] = videoBookCodes["OT"] + videoBookCodes["NT"]
+
 @app.route("/v1/videos", methods=["GET"])
 def getVideos():
 	'''Fetch the metadata for the videos with an option to filter by language.'''
@@ -3638,21 +3719,14 @@ def getVideos():
 		if not rst:
 			return '{"success":false, "message":"No videos available"}'
 		videos = []
-		ot_books = "gen,exo,lev,num,deu,jos,jdg,rut,1sa,2sa,1ki,2ki,1ch,2ch,ezr,neh,est,job,psa,\
-			pro,ecc,sng,isa,jer,lam,ezk,dan,hos,jol,amo,oba,jon,mic,nam,hab,zep,hag,zec,mal"
-		nt_books ="mat,mrk,luk,jhn,act,rom,1co,2co,gal,eph,php,col,1th,2th,1ti,2ti,tit,phm,heb,\
-			jas,1pe,2pe,1jn,2jn,3jn,jud,rev"
 		for book, url, title, description, theme, language_id, name, code in rst:
-			if book == "OT":
-				book = ot_books
-			elif book == "NT":
-				book = nt_books
-			elif book == "FB":
-				book = ot_books+nt_books
-			books = book.split(",")
+			books = videoBookCodes.get(book)
+			if books is None:
+				books = [book_code.strip() for book_code in book.split(",")]
+			language = {'name':name,'code':code,'id':language_id}
 			for book_code in books:
-				videos.append({ 'book':book_code.strip(), 'title':title, 'url':url, 'description':description,
-				 'theme':theme, 'language':{'name':name,'code':code,'id':language_id}})
+				videos.append({ 'book':book_code, 'title':title, 'url':url, 'description':description,
+				 'theme':theme, 'language':language})
 		# Group and sort dictionaries by book
 		videos = reduce(sortVideosByLanguage, videos, [])
 		videos = map(sortVideosByBooks, videos)
@@ -3719,21 +3793,18 @@ def searchBible(sourceId):
 		keyword = request.args.get('keyword')
 		if not keyword:
 			return '{"success":false, "message":"Keyword empty"}'
-		cursor.execute("select book_id,book_code from bible_books_look_up")
-		rst = cursor.fetchall()
-		bookMap={}
-		for book_id,book_code in rst:
-			bookMap[str(book_id)]=book_code
+		bookMap = getBibleBookIds()
 		cursor.execute(sql.SQL("select ref_id,verse from {} where verse ~* {}").\
 			format(sql.Identifier(tableName[0] + "_cleaned"),sql.Literal(keyword)))
 		rst = cursor.fetchall()
 		if not rst:
 			return '{"success":false, "message":"Keyword not found in bible"}'
-		result =[]
-		for ref_id,verse in rst:
-			ref = str(ref_id)
-			bookCode = bookMap[ref[-8:-6]]
-			result.append({'bookCode':bookCode,'chapter':int(ref[-6:-3]),'verse': int(ref[-3:]),'text':verse})
+		# ref_id is bbbcccvvv, split with divmod instead of slicing its string
+		result = []
+		for ref_id, verse in rst:
+			bookId, chapterVerse = divmod(ref_id, 1000000)
+			chapter, verseNumber = divmod(chapterVerse, 1000)
+			result.append({'bookCode':bookMap[bookId],'chapter':chapter,'verse': verseNumber,'text':verse})
 		searchResult = {'sourceId':sourceId,'keyword':keyword,'result':result}
 		return json.dumps(searchResult)
 	except Exception as ex:
@@ -3798,9 +3869,7 @@ def addbiblebooknames():
         cursor.execute("select book_id from bible_book_names where language_id=%s",(languageId,))
         rst = cursor.fetchall()
         bookIds = [b[0] for b in rst]
-        cursor.execute("select book_id,book_code from bible_books_look_up")
-        rst = cursor.fetchall()
-        bookMap = {row[1]:row[0] for row in rst}
+        bookMap = getBibleBookCodes()
         bookData = []
         added = []
         skipped = []
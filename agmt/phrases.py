@@ -1,21 +1,53 @@
-import psycopg2, re
+import psycopg2, re, json
+import os
+import sys
+import logging
+from collections import Counter
+from itertools import islice
 from psycopg2 import sql
+from psycopg2.extras import execute_values
 import spacy
 from spacy.matcher import Matcher
 from gensim.models.phrases import Phrases
 
+log = logging.getLogger(__name__)
+
+# the trained spacy model used by the rule based phrase extraction, kept next to this module
+spacy_model_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', 'model-final')
+# loaded on first use, only the rule based extraction needs it
+spacy_model = None
+
+# returns the spacy model, loading it from disk only the first time
+def get_spacy_model():
+	global spacy_model
+	if spacy_model is None:
+		spacy_model = spacy.load(spacy_model_path)
+	return spacy_model
+
 # the puctuations that are removed from text for getting a clean text
 # "-" is left out intentionally in this list because, it is ofter used in text to show compund words
 non_letters = [',', '"', '!', '.', '\n', '\\','“','”','“','*','।','?',';',"'","’","(",")","‘","—"]
-non_letter_pattern = re.compile(r'['+''.join(non_letters)+']')
-multi_space_pattern = re.compile(r'\s\s+')
+# every punctuation is mapped to a space by str.translate, which is a plain character lookup
+# in C rather than a regex. split() drops the extra spaces afterwards
+non_letter_table = str.maketrans(dict.fromkeys(non_letters, ' '))
+whitespace_pattern = re.compile(r'\s')
 
 # the stop words are functional words in Hindi, which are treated separately while generating phrases
 hi_stop_words = [ "ओर", "कर", "करके", "करता", "करते", "करना", "करने", "करे", "करें", "करेगा", "करो", 
-			  "का", "कि", "किया", "किस", "किसी", "की", "के", "को",  "तो", "था", "थी", "थे", "ने", "पर"
-			  "भी", "में", "रहा", "रहे", "रहो", "से", "हर", "ही", "हुआ", "हुई", "हुए", "हुओं", "हूँ", "हे"
+			  "का", "कि", "किया", "किस", "किसी", "की", "के", "को",  "तो", "था", "थी", "थे", "ने", "पर",
+			  "भी", "में", "रहा", "रहे", "रहो", "से", "हर", "ही", "हुआ", "हुई", "हुए", "हुओं", "हूँ", "हे",
 			  "है", "हैं", "हो", "होकर", "होगा", "होता", "होने" ]
 
+# built once, the stop words are only ever used for membership tests
+stop_word_sets = {
+	'hi': frozenset(hi_stop_words),
+	'hin': frozenset(hi_stop_words),
+}
+
+# returns the stop words of the lang as a frozenset, empty if the language has none
+def get_stop_words(lang):
+	return stop_word_sets.get(lang, frozenset())
+
 
 # the scoring algo used to score the phrases generated by rules and naive-freq models
 def phrase_rank(phrase_freq,word_freqs):
@@ -27,65 +59,76 @@ def phrase_rank(phrase_freq,word_freqs):
 # retruns a freq dictionary of words in the input snetences
 # used for scoring the phrases generated by n-gram and rules
 def uniquewords_freq_dict(sent_stream):
-	word_list = {}
-
+	# counted a verse at a time by Counter.update, instead of a membership test and add per word
+	word_list = Counter()
 	for verse in sent_stream:
-		for w in verse:
-			if w in word_list:
-				word_list[w] += 1
-			else:
-				word_list[w] = 1
-	sorted_word_list = {k:word_list[k] for k in sorted(word_list,key=word_list.get,reverse=True)}
-	return sorted_word_list
+		word_list.update(verse)
+	# only ever looked up by word, so it is not sorted by frequency
+	return word_list
 
 # removes punctuations and splits the sentence into words
 def cleanNsplit(sent):
 	try:
-		sent = re.sub(non_letter_pattern," ",sent)
-		sent = re.sub(multi_space_pattern," ",sent)
-		sent = sent.strip()
-		sent = sent.split(' ')
-		
+		sent = sent.translate(non_letter_table)
+		# split() without a separator collapses runs of whitespace and drops the
+		# leading and trailing ones in the same pass, so no extra sub/strip is needed.
+		# Words repeat a lot across a bible, interning keeps one copy of each in memory
+		sent = list(map(sys.intern, sent.split()))
 	except Exception as e:
 		print('sent:',sent)
 		raise e
 	return sent
 
+# reads the verses with a server side cursor and yields their ref_id and words, so that only a
+# batch of raw rows is held in memory at a time instead of the whole fetched result
+def stream_verse_words(conn,query,params=None):
+	cursor = conn.cursor(name='verse_stream')
+	cursor.itersize = 2000
+	try:
+		cursor.execute(query,params)
+		for ref_id, verse in cursor:
+			yield ref_id, cleanNsplit(verse)
+	finally:
+		cursor.close()
+
+# returns the split words of every verse of the lang and version, in ref_id order.
+# The models only read it, so one copy can be used to train more than one of them
+def bible_words(conn,lang,version):
+	source_table = lang+'_'+version+'_bible_cleaned'
+	query = sql.SQL("select ref_id, verse from {} order by ref_id;").format(sql.Identifier(source_table))
+	return [words for ref_id, words in stream_verse_words(conn,query)]
+
 
 #############Using Gensim #######################
 
 def train_bigram_gensimmodel(sentence_stream,stop_words):
-	bigram_phrase_model = Phrases(sentence_stream, common_terms=frozenset(stop_words), min_count=5	, threshold=10)
+	bigram_phrase_model = Phrases(sentence_stream, common_terms=stop_words, min_count=5	, threshold=10)
 	return bigram_phrase_model
 def train_trigram_gensimmodel(sentence_stream,stop_words):
 	bigram_phrase_model = train_bigram_gensimmodel(sentence_stream,stop_words)
-	trigram_phrase_model = Phrases(bigram_phrase_model[sentence_stream], common_terms=frozenset(stop_words), min_count=3, threshold=10)
+	trigram_phrase_model = Phrases(bigram_phrase_model[sentence_stream], common_terms=stop_words, min_count=3, threshold=10)
 	return trigram_phrase_model
 def gensimphrases_dict(model,sentence_stream):
 	phrase_list = {}
 	for phrase, score in model.export_phrases(sentence_stream):
-		if phrase not in phrase_list:
-			phrase = phrase.decode("utf-8")
+		# gensim gives the phrase as utf-8 bytes, the dict is keyed by the decoded text. It is
+		# decoded before the lookup, a bytes key is never in the dict and every repeat was
+		# stored again as new with a freq of 1
+		phrase = phrase.decode("utf-8")
+		entry = phrase_list.get(phrase)
+		if entry is None:
 			phrase_list[phrase] = {'freq' : 1, 'score':score}
 		else:
-			phrase_list[phrase]['freq'] += 1
+			entry['freq'] += 1
 	return phrase_list    
 
 # Pulls bible text from DB
 # returns a dict of phrases, with freq and score 
 # uses the Phrases module of gensim library
-def extract_phrases_gensim(conn,lang,version):
-	source_table = lang+'_'+version+'_bible_cleaned'
-
-	cursor = conn.cursor()
-	cursor.execute(sql.SQL("select ref_id, verse from {} order by ref_id;").format(sql.Identifier(source_table)))
-	verses = cursor.fetchall()
-	text = [cleanNsplit(v[1])for v in verses]
-
-	if lang == "hi" or lang == "hin":
-		stop_words = hi_stop_words
-	else:
-		stop_words = []
+def extract_phrases_gensim(conn,lang,version,text=None):
+	if text is None:
+		text = bible_words(conn,lang,version)
+	stop_words = get_stop_words(lang)
 
 	model = train_trigram_gensimmodel(text,stop_words)
 	phrases = gensimphrases_dict(model,text)
@@ -97,46 +140,28 @@ def extract_phrases_gensim(conn,lang,version):
 
 ###########Naive N-gram Model ###########################
 
+# the n-grams are built by zip over the word list shifted by islice, without indexing word by
+# word and without copying the verse for every shift
 def get_bigrams(sent):
-	bigrams = []
-	for i in range(len(sent)-1):
-		bigrams.append((sent[i],sent[i+1]))
-	return bigrams  
+	return zip(sent, islice(sent, 1, None))
 def get_trigrams(sent):
-	trigrams = []
-	for i in range(len(sent)-2):
-		trigrams.append((sent[i],sent[i+1],sent[i+2]))
-	return trigrams  
+	return zip(sent, islice(sent, 1, None), islice(sent, 2, None))
 def ngramphrases_dict(sent_stream, word_dict):
-	phrase_list = {}
+	# Counter.update counts in C, keeping the first seen order that the gensim-ngram merge depends on
+	phrase_list = Counter()
 	for verse in sent_stream:
-		bigrams_in_verse = get_bigrams(verse)
-		trigrams_in_verse = get_trigrams(verse)
-		for bigram in bigrams_in_verse:
-			if bigram in phrase_list:
-				phrase_list[bigram] +=1
-			else:
-				phrase_list[bigram] = 1
-		for trigram in trigrams_in_verse:
-			if trigram in phrase_list:
-				phrase_list[trigram] +=1
-			else:
-				phrase_list[trigram] = 1
-	sorted_phrase_list = {k: phrase_list[k] for k in sorted(phrase_list, key=phrase_list.get, reverse=True)}
-
-	phrase_score_dict = {" ".join(list(ph)):{'freq':phrase_list[ph],'score':phrase_rank(phrase_list[ph],[word_dict[w] for w in ph])} for ph in phrase_list}
+		phrase_list.update(get_bigrams(verse))
+		phrase_list.update(get_trigrams(verse))
+
+	phrase_score_dict = {" ".join(ph):{'freq':freq,'score':phrase_rank(freq,[word_dict[w] for w in ph])} for ph,freq in phrase_list.items()}
 	return phrase_score_dict
 
 # pulls all available bible text from DB
 # returns a dict of phrases, with freq and score 
 # all bi-grams and tri-grams are considered as valid phrases
-def extract_phrases_naivestat(conn,lang,version):
-	source_table = lang+'_'+version+'_bible_cleaned'
-
-	cursor = conn.cursor()
-	cursor.execute("select ref_id, verse from " + source_table + " order by ref_id;")
-	verses = cursor.fetchall()
-	text = [cleanNsplit(v[1])for v in verses]
+def extract_phrases_naivestat(conn,lang,version,text=None):
+	if text is None:
+		text = bible_words(conn,lang,version)
 
 	word_dict = uniquewords_freq_dict(text)
 	phrases = ngramphrases_dict(text,word_dict)
@@ -162,20 +187,22 @@ def add_rules_toDB(conn,lang,input_file):
 	cursor.execute("select exists (select * from information_schema.tables where table_name= %s)",(rules_table,))
 	tableExists = cursor.fetchone()[0]
 
-	print('checking table')
+	log.debug('checking table %s', rules_table)
 	if not tableExists:
 		cursor.execute(sql.SQL("CREATE TABLE {}(ID INT NOT NUll, Rule TEXT NOT NULL)").format(sql.Identifier(rules_table)))
 		conn.commit()
 	else:
-		print('table found')
 		cursor.execute(sql.SQL("DELETE FROM {};").format(sql.Identifier(rules_table)))
-		print('truncated '+rules_table)
+		log.debug('truncated %s', rules_table)
 		conn.commit()
 
+	# read the file in one go; blank lines are not rules and would break json.loads later
 	with open(input_file,'r') as infile:
-		for i,line in enumerate(infile):
-			cursor.execute(sql.SQL("INSERT INTO {} VALUES(%s,%s)").format(sql.Identifier(rules_table)),(i,line))
-		conn.commit()
+		rules = [line for line in infile.read().splitlines() if line.strip()]
+	# all the rules go in multi-row inserts, instead of a statement per rule
+	execute_values(cursor, sql.SQL("INSERT INTO {} VALUES %s").format(sql.Identifier(rules_table)), \
+		list(enumerate(rules)), page_size=1000)
+	conn.commit()
 
 def get_spacyphrases(verse,nlp,matcher):
 	doc = nlp(verse)
@@ -186,7 +213,7 @@ def get_spacyphrases(verse,nlp,matcher):
 	return phrases
 
 def spacyphrases_dict(sent_stream,nlp,matcher,word_dict):
-	phrase_list = {}
+	phrase_list = Counter()
 	# for verse in sent_stream:
 		# phrases_in_verse = get_spacyphrases(verse,nlp,matcher)
 		# for phrase in phrases_in_verse:
@@ -195,62 +222,90 @@ def spacyphrases_dict(sent_stream,nlp,matcher,word_dict):
 		batches.append(" ".join(sent_stream[x*5000:x*5000+5000]))
 	batches.append(" ".join(sent_stream[-5000:]))
 	for batch in batches:
-		phrases_in_batch = get_spacyphrases(batch,nlp,matcher)
-		for phrase in phrases_in_batch:
-			if phrase in phrase_list:
-				phrase_list[phrase] +=1
-			else:
-				phrase_list[phrase] = 1
-	print('obtained phrases... now sorting and scoring them')
-	sorted_phrase_list = {k: phrase_list[k] for k in sorted(phrase_list, key=phrase_list.get, reverse=True)}
+		phrase_list.update(get_spacyphrases(batch,nlp,matcher))
+	log.debug('obtained phrases... now scoring them')
+	# the phrases are only looked up, so they are scored in the order found without sorting
 	try:
 		phrase_score_dict = {ph:{
-						'freq':sorted_phrase_list[ph],
-						'score':phrase_rank(sorted_phrase_list[ph],[word_dict[w] for w in ph.split(" ")])} 
-						for ph in sorted_phrase_list }
-		# pass
+						'freq':freq,
+						'score':phrase_rank(freq,[word_dict[w] for w in ph.split(" ")])} 
+						for ph,freq in phrase_list.items() }
 	except Exception as e:
-		# print(sorted_phrase_list:,sorted_phrase_list)
-		print('ph:',ph)
+		log.exception('scoring the spacy phrases failed')
 		raise e
 	return phrase_score_dict
 
-# pulls all available bible text from DB
-# returns a dict of phrases, with freq and score 
-# uses the matcher class of spacy rather than the phrases class
-def extract_phrases_rulebased(conn,lang,version,start=None,end=None):
-	source_table = lang+'_'+version+'_bible_cleaned'
-	rules_table = lang+'_phrase_rules'
+# returns the row count of the table and an md5 of its rows in id order, which changes whenever
+# a row is added, removed or edited. A count alone misses the rows that are edited or replaced
+def table_digest(cursor,table,id_column,value_column):
+	cursor.execute(sql.SQL("select count(*), md5(string_agg({id} || ':' || {value}, '|' order by {id})) from {table};").format(
+		id=sql.Identifier(id_column),value=sql.Identifier(value_column),table=sql.Identifier(table)))
+	return cursor.fetchone()
 
+# returns a digest of the phrase rules of the lang, which changes whenever add_rules_toDB
+# replaces them, or None if the lang has no rules table
+def get_rules_digest(conn,lang):
+	rules_table = lang+'_phrase_rules'
 	cursor = conn.cursor()
-
 	cursor.execute("select exists (select * from information_schema.tables where table_name= %s)",(rules_table,))
 	tableExists = cursor.fetchone()[0]
+	digest = None
+	if tableExists:
+		digest = table_digest(cursor,rules_table,'id','rule')
+	cursor.close()
+	return digest
 
-	if not tableExists:
-		print("!!!No Rules found in DB! Falls back to Gensim tokenizer")
-		phrases = extract_phrases_gensim(conn,lang,version)
-	else:
-		nlp = spacy.load('models/model-final')
-		matcher = Matcher(nlp.vocab)
+# the spacy matchers built from the phrase rules of each lang, with the digest of the rules
+rule_matcher_cache = {}
 
+# returns a matcher with the phrase rules of the lang, given their digest from get_rules_digest.
+# The rules are parsed and added to a new matcher only when they have changed since the last one was built
+def get_rule_matcher(conn,lang,nlp,digest):
+	rules_table = lang+'_phrase_rules'
+	cached = rule_matcher_cache.get(lang)
+	if cached is None or cached[0] != digest:
+		matcher = Matcher(nlp.vocab)
+		cursor = conn.cursor()
 		cursor.execute(sql.SQL("SELECT ID,Rule from {} order by ID;").format(sql.Identifier(rules_table)))
 		rules = cursor.fetchall()
+		cursor.close()
 
 		for row in rules:
-			rul = eval(row[1])
+			# rules are stored as JSON (see add_rules_toDB), parse them instead of eval'ing
+			rul = json.loads(row[1])
 			matcher.add('rule'+str(row[0]),None,rul)
+		cached = (digest, matcher)
+		rule_matcher_cache[lang] = cached
+	return cached[1]
+
+# pulls all available bible text from DB
+# returns a dict of phrases, with freq and score 
+# uses the matcher class of spacy rather than the phrases class
+# the digest of the rules is read here unless the caller already has it
+def extract_phrases_rulebased(conn,lang,version,start=None,end=None,rules_digest=None):
+	source_table = lang+'_'+version+'_bible_cleaned'
+	if rules_digest is None:
+		rules_digest = get_rules_digest(conn,lang)
+
+	cursor = conn.cursor()
+
+	if rules_digest is None:
+		log.warning("No Rules found in DB! Falls back to Gensim tokenizer")
+		phrases = extract_phrases_gensim(conn,lang,version)
+	else:
+		nlp = get_spacy_model()
+		matcher = get_rule_matcher(conn,lang,nlp,rules_digest)
 
 		if start and end:
-			cursor.execute(sql.SQL("select ref_id, verse from {} where ref_id>=%s and ref_id<%s order by ref_id;").format(sql.Identifier(source_table)),(start_refid,end_refid,))
+			cursor.execute(sql.SQL("select ref_id, verse from {} where ref_id>=%s and ref_id<%s order by ref_id;").format(sql.Identifier(source_table)),(start,end,))
 		elif start and not end:
 			end = start + 1000000
-			cursor.execute(sql.SQL("select ref_id, verse from {} where ref_id>=%s and ref_id<%s order by ref_id;").format(sql.Identifier(source_table)),(start_refid,end_refid,))
+			cursor.execute(sql.SQL("select ref_id, verse from {} where ref_id>=%s and ref_id<%s order by ref_id;").format(sql.Identifier(source_table)),(start,end,))
 		else:
 			cursor.execute(sql.SQL("select ref_id, verse from {} order by ref_id;").format(sql.Identifier(source_table)))
 		verses = cursor.fetchall()
-		text = [' '.join(cleanNsplit(v[1])) for v in verses]
 		word_split_text = [cleanNsplit(v[1]) for v in verses]
+		text = [' '.join(words) for words in word_split_text]
 
 		word_dict = uniquewords_freq_dict(word_split_text)
 		phrases = spacyphrases_dict(text,nlp,matcher,word_dict)
@@ -260,24 +315,7 @@ def extract_phrases_rulebased(conn,lang,version,start=None,end=None):
 
 
 
-# The method can identify phrases from all the available text for the specified lang and version
-# Then generate the tokens(if possible phrases, other wise words)
-# for the selected Book.
-# the generated tokens are populated into the DB table for that lnaguage
-# Example usage from an extenral file:
-#		import phrases
-#		import psycopg2
-#
-#		db = psycopg2.connect(dbname='mt2414_local', user='postgres', password='password', host='localhost', port=5432)
-#		phrases.tokenize(conn=db, lang='hi', version='irv4', book_id=40)
-# it can take an optional parameter algo
-# algo takes values `gensim`, `ngram`, `gensim-ngram`, `rule-based` or `single-word`. If not specified, defaults to `gensim-ngram`	
-def tokenize(conn,lang,version,book_id,algo='gensim-ngram'):
-	print('*******')
-	print('phrases modules')
-	print(lang, version, book_id)
-	start_refid = book_id * 1000000
-	end_refid = start_refid + 1000000
+def extract_phrases(conn,lang,version,algo,start_refid,end_refid,rules_digest=None):
 	if (algo == 'gensim'):
 		phrases = extract_phrases_gensim(conn,lang,version)
 	elif( algo == 'ngram'):
@@ -285,48 +323,160 @@ def tokenize(conn,lang,version,book_id,algo='gensim-ngram'):
 		# print(phrases.keys())
 		# return
 	elif( algo == 'rule-based'):
-		phrases = extract_phrases_rulebased(conn,lang,version,start=start_refid,end=end_refid)
+		phrases = extract_phrases_rulebased(conn,lang,version,start=start_refid,end=end_refid,rules_digest=rules_digest)
 	elif( algo == 'single-word'):
 		phrases = {}
 	elif ( algo == 'gensim-ngram'):
-		phrases = extract_phrases_gensim(conn,lang,version)
-		phrases2 = extract_phrases_naivestat(conn,lang,version)
+		# both models are trained on the same text, which is read and split only once
+		text = bible_words(conn,lang,version)
+		phrases = extract_phrases_gensim(conn,lang,version,text)
+		phrases2 = extract_phrases_naivestat(conn,lang,version,text)
 		for i,ph in enumerate(phrases2):
 			if ph not in phrases:
 				phrases[ph] = phrases2[ph]
 			if i > 250:
 				break
-	print('stop words')
-	stop_words = []
-	if lang == 'hi' or lang == 'hin':
-		stop_words = hi_stop_words
+	return phrases
 
+# the phrases are extracted from all the text of a language and version, which means
+# training the models over the whole bible. They are kept per process and are reused
+# until the cleaned text changes, which is detected by the text version of its source.
+phrase_cache = {}
+
+# maps the first word of every multi word phrase to the word counts of the phrases starting with it,
+# so that tokenize only has to look at the spans that can possibly be a known phrase
+def first_word_index(phrase_list):
+	index = {}
+	for ph in phrase_list:
+		words = ph.split(' ')
+		if len(words) > 1:
+			index.setdefault(words[0], set()).add(len(words))
+	return compact_index(index)
+
+# the word counts are kept as tuples once the index is built. An index has an entry for every
+# first word, and a set of a few ints takes about four times the memory of a tuple of them
+def compact_index(index):
+	return {word:tuple(lengths) for word,lengths in index.items()}
+
+# returns the set of phrases and their first word index
+def get_phrases(conn,lang,version,algo,start_refid,end_refid):
+	if algo == 'single-word':
+		return frozenset(), {}
+	source_table = lang+'_'+version+'_bible_cleaned'
 	cursor = conn.cursor()
+	# uploadSource bumps the text version in the transaction adding the verses, so reading
+	# it tells if the text has changed without reading the text
+	cursor.execute("select text_version from sources where table_name=%s",(lang+'_'+version+'_bible',))
+	row = cursor.fetchone()
+	if row is None:
+		# a bible loaded without a source, as from the shell, is stamped with its verse count
+		cursor.execute(sql.SQL("select count(*) from {};").format(sql.Identifier(source_table)))
+		row = cursor.fetchone()
+	stamp = row[0]
+	cursor.close()
+	key = (lang, version, algo)
+	rules_digest = None
+	if algo == 'rule-based':
+		# the rule based phrases are extracted only from the book being tokenized,
+		# and have to be extracted again when the rules change
+		key += (start_refid, end_refid)
+		rules_digest = get_rules_digest(conn,lang)
+		stamp = (stamp, rules_digest)
+	cached = phrase_cache.get(key)
+	if cached is None or cached[0] != stamp:
+		# tokenize only tests membership, so the freq and score dicts of every phrase are not kept
+		phrases = frozenset(extract_phrases(conn,lang,version,algo,start_refid,end_refid,rules_digest))
+		cached = (stamp, phrases, first_word_index(phrases))
+		phrase_cache[key] = cached
+	return cached[1], cached[2]
+
+# translation words of a language, cached with the digest of the tw table they were read at.
+# The tw tables are loaded outside of the api and have a few thousand rows, so they are digested
+tw_cache = {}
+
+# returns the set of translation word forms for the lang and their first word index
+def get_tw_wordforms(conn,lang):
 	tw_table = lang+'_tw'
+	cursor = conn.cursor()
 	cursor.execute("select exists (select * from information_schema.tables where table_name=%s)",(tw_table,))
 	tableExists = cursor.fetchone()[0]
-	if tableExists:
+	if not tableExists:
+		cursor.close()
+		return frozenset(), {}
+	tw_digest = table_digest(cursor,tw_table,'id','wordforms')
+	cached = tw_cache.get(lang)
+	if cached is None or cached[0] != tw_digest:
 		cursor.execute(sql.SQL('select wordforms from {} order by id;').format(sql.Identifier(tw_table)))
-	tws = []
-	for row in cursor.fetchall():
-		wordforms = [x.strip() for x in row[0].split(',')]
-		tws += wordforms
-	
-	for ph in tws:
-		if ph not in phrases:
-			phrases[ph] = {'freq':None,'score':None}
+		tws = set()
+		for row in cursor:
+			tws.update(x.strip() for x in row[0].split(','))
+		tws.discard('')
+		tws = frozenset(tws)
+		cached = (tw_digest, tws, first_word_index(tws))
+		tw_cache[lang] = cached
+	cursor.close()
+	return cached[1], cached[2]
+
+# the known spans of the last phrase and translation word sets that were combined, with those sets
+known_spans_cache = {}
+
+# returns the phrases and translation words as one set with one first word index, so that
+# tokenize matches every span against all the patterns with a single lookup
+def get_known_spans(phrases,phrase_index,tws,tw_index,key):
+	cached = known_spans_cache.get(key)
+	if cached is None or cached[0] is not phrases or cached[1] is not tws:
+		if not tws:
+			known, index = phrases, phrase_index
+		elif not phrases:
+			known, index = tws, tw_index
+		else:
+			known = phrases | tws
+			index = {word:set(lengths) for word,lengths in phrase_index.items()}
+			for word,lengths in tw_index.items():
+				index.setdefault(word, set()).update(lengths)
+			index = compact_index(index)
+		cached = (phrases, tws, known, index)
+		known_spans_cache[key] = cached
+	return cached[2], cached[3]
+
+
+# The method can identify phrases from all the available text for the specified lang and version
+# Then generate the tokens(if possible phrases, other wise words)
+# for the selected Book.
+# the generated tokens are populated into the DB table for that lnaguage
+# Example usage from an extenral file:
+#		import phrases
+#		import psycopg2
+#
+#		db = psycopg2.connect(dbname='mt2414_local', user='postgres', password='password', host='localhost', port=5432)
+#		phrases.tokenize(conn=db, lang='hi', version='irv4', book_id=40)
+# it can take an optional parameter algo
+# algo takes values `gensim`, `ngram`, `gensim-ngram`, `rule-based` or `single-word`. If not specified, defaults to `gensim-ngram`	
+def tokenize(conn,lang,version,book_id,algo='gensim-ngram'):
+	tokenize_books(conn,lang,version,[book_id],algo)
+
+# tokenizes several books of the lang and version together, so that the translation words,
+# the token table checks and the commits are done once for all of them instead of once per book
+def tokenize_books(conn,lang,version,book_ids,algo='gensim-ngram'):
+	log.info("tokenizing %s %s books %s using %s", lang, version, book_ids, algo)
+	stop_words = get_stop_words(lang)
+
+	# the cached sets are shared between calls and must not be modified
+	tws, tw_index = get_tw_wordforms(conn,lang)
 
 	source_table = lang+'_'+version+'_bible_cleaned'
-	if start_refid and end_refid:
-		query = sql.SQL("select ref_id, verse from {} where ref_id>=%s and ref_id<%s order by ref_id;").format(sql.Identifier(source_table),)
-		params = (start_refid,end_refid,)
-	else:
-		params = None
-		query = sql.SQL("select ref_id, verse from {} order by ref_id;").format(sql.Identifier(source_table))
-	cursor.execute(query,params)
-	rows = cursor.fetchall()
-	verses = [(r[0],cleanNsplit(r[1])) for r in rows]
+	query = sql.SQL("select ref_id, verse from {} where ref_id>=%s and ref_id<%s order by ref_id;").format(sql.Identifier(source_table),)
+	book_verses = []
+	for book_id in book_ids:
+		start_refid = book_id * 1000000
+		end_refid = start_refid + 1000000
+		phrases, phrase_index = get_phrases(conn,lang,version,algo,start_refid,end_refid)
+		known, known_index = get_known_spans(phrases,phrase_index,tws,tw_index,(lang,version,algo))
+		# read before the token table is reset, the commits below would close the server side cursor
+		verses = list(stream_verse_words(conn,query,(start_refid,end_refid,)))
+		book_verses.append((book_id, verses, known, known_index))
 
+	cursor = conn.cursor()
 	token_table =lang+'_'+version+'_bible_tokens'
 	cursor.execute("select exists (select * from information_schema.tables where table_name= %s)",(token_table,))
 	tableExists = cursor.fetchone()[0]
@@ -335,47 +485,65 @@ def tokenize(conn,lang,version,book_id,algo='gensim-ngram'):
 		cursor.execute(sql.SQL("CREATE TABLE {}(book_id INT NOT NUll, token TEXT NOT NULL)").format(sql.Identifier(token_table)))
 		conn.commit()
 	else:
-		# in the assumption that tokenization would always be done for one book at a time
-		cursor.execute(sql.SQL("DELETE FROM {} WHERE book_id=%s ;").format(sql.Identifier(token_table)),(book_id,))
+		cursor.execute(sql.SQL("DELETE FROM {} WHERE book_id = ANY(%s);").format(sql.Identifier(token_table)),(list(book_ids),))
 		conn.commit()		
 
-	tokens = []
+	token_rows = []
+	for book_id, verses, known, known_index in book_verses:
+		token_rows.extend((book_id, tok) for tok in verse_tokens(verses,known,known_index,stop_words))
+	# one multi-row insert per page instead of a round-trip per token
+	execute_values(cursor, sql.SQL("INSERT INTO {} (book_id, token) VALUES %s").format(sql.Identifier(token_table)), \
+		token_rows, page_size=1000)
+	conn.commit()
+	cursor.close()
+
+# returns the sorted tokens of the verses, the known spans where possible and the other non stop words
+def verse_tokens(verses,known,known_index,stop_words):
+	# a set, so that the seen check for each word does not scan all the tokens found so far
+	tokens = set()
+	if not known_index:
+		# single-word and no translation words: no span can be a phrase, every word is a token
+		for row in verses:
+			tokens.update(row[1])
+		tokens.difference_update(stop_words)
+		verses = []
 	for row in verses:
 		ref_id = row[0]
 		word_split_text = row[1]
 		N = len(word_split_text)
 		taken = [False for i in range(N)]
-		for n in range(N,1,-1):
-			for i in range(N-n+1):
-				chunk = word_split_text[i:i+n]
-				if ' '.join(chunk) in phrases:
-					taken_check = False
-					for index in range(i,i+n):
-						if taken[index]:
-							taken_check = True
-							break
-					if taken_check == False:
-						for index in range(i,i+n):
-							taken[index] = True
-						phrase = ' '.join(word_split_text[i:i+n])
-						if phrase not in tokens: 
-							tokens.append(phrase)
+		# a single pass over the words collects the spans that are known phrases, using the
+		# first word index instead of joining every span of every length
+		matches = []
+		for i,word in enumerate(word_split_text):
+			lengths = known_index.get(word)
+			if lengths is None:
+				continue
+			for n in lengths:
+				if i+n <= N:
+					joined_chunk = ' '.join(word_split_text[i:i+n])
+					if joined_chunk in known:
+						matches.append((-n, i, joined_chunk))
+		# longer phrases win, and among equal lengths the earlier one, as in a longest first scan
+		matches.sort()
+		for n,i,joined_chunk in matches:
+			n = -n
+			# check and mark the whole span at once, instead of word by word
+			if not any(taken[i:i+n]):
+				taken[i:i+n] = [True]*n
+				tokens.add(joined_chunk)
 		for i,flag in enumerate(taken):
 			if not flag:
 				word_token = word_split_text[i]
-				if word_token not in stop_words and word_token not in tokens:
-					tokens.append(word_token)
+				if word_token not in stop_words:
+					tokens.add(word_token)
 
 	sorted_tokens = sorted(tokens)
 	tokens = []
 	for tok in sorted_tokens:
 		if not any(char.isdigit() for char in tok):
 			tokens.append(tok)
-	for tok in tokens:
-		cursor.execute(sql.SQL("INSERT INTO {} (book_id, token) VALUES(%s,%s)").format(sql.Identifier(token_table)),(book_id,tok))
-		# print(tok)
-	conn.commit()
-	cursor.close()
+	return tokens
 
 
 
@@ -388,60 +556,90 @@ def tokenize(conn,lang,version,book_id,algo='gensim-ngram'):
 
 ################################ Draft Generation ############################
 
-tokenTranslatedDict = {}
+# the token translations of the projects drafted last, with the digest of them they were read at
+phrase_translations_cache = {}
+phrase_translations_cache_size = 32
 
+# returns the token translations of the project and the index of their first words, to
+# the word counts of the tokens starting with them, or None if the project has no translations.
+# They are returned rather than kept in module globals, which concurrent drafts of different
+# projects would overwrite for each other
 def loadPhraseTranslations(conn, projectId):
-	global tokenTranslatedDict
 	cursor = conn.cursor()
-	# cursor.execute("select token, translation from translations where source_id=%s \
-    #     and target_id=%s", (sourceId, targetLanguageId))
-	# rst = cursor.fetchall()
-	cursor.execute("select t.token, t.translation from translations t left join \
-        translation_projects_look_up l on t.translation_id=l.translation_id where l.project_id=%s \
-        ", (projectId,))
-
-	rst = cursor.fetchall()
-	if rst:
-		tokenTranslatedDict = {k:v for k,v in rst}
-		return True
-	else:
-		print("!!!!Error: token translations not obtained!!!")
-		return False
-
-
-def getNgrams(sent,n):
-	ngrams = []
-	for i in range(len(sent)):
-		if i+n <= len(sent)+1:
-			ngrams.append(sent[i:i+n-1])
-	return ngrams
-
-
-
-def translateText(text_snippet):
-	words_in_text = re.split(r"\s",text_snippet)
-
+	# the digest is taken over the committed translations of the project itself, so it changes
+	# with every translation added to, edited in or removed from it, and only with those. It is
+	# read through the project index and sends back one row, instead of all the translations
+	cursor.execute("select count(*), md5(string_agg(t.translation_id || ':' || t.token || ':' || \
+		coalesce(t.translation,''), '|' order by t.translation_id)) from translations t join \
+		translation_projects_look_up l on t.translation_id=l.translation_id where l.project_id=%s", (projectId,))
+	digest = cursor.fetchone()
+	cached = phrase_translations_cache.pop(projectId, None)
+	if cached is None or cached[0] != digest:
+		# cursor.execute("select token, translation from translations where source_id=%s \
+	    #     and target_id=%s", (sourceId, targetLanguageId))
+		# rst = cursor.fetchall()
+		cursor.execute("select t.token, t.translation from translations t left join \
+	        translation_projects_look_up l on t.translation_id=l.translation_id where l.project_id=%s \
+	        ", (projectId,))
+
+		rst = cursor.fetchall()
+		if rst:
+			tokenTranslatedDict = {k:v for k,v in rst}
+			cached = (digest, (tokenTranslatedDict, translation_trie(tokenTranslatedDict)))
+		else:
+			cached = (digest, None)
+		if len(phrase_translations_cache) >= phrase_translations_cache_size:
+			# drop the project used longest ago
+			phrase_translations_cache.pop(next(iter(phrase_translations_cache)))
+	cursor.close()
+	# put back last, so that the order of the cache is the order of use
+	phrase_translations_cache[projectId] = cached
+	if cached[1] is None:
+		log.warning("token translations not obtained for project %s", projectId)
+	return cached[1]
+
+
+# builds a word level prefix tree of the translated tokens: each node maps the next word to
+# its child node, and the None key of a node holds the token that ends there
+def translation_trie(tokenTranslatedDict):
+	trie = {}
+	for token in tokenTranslatedDict:
+		node = trie
+		for word in token.split(' '):
+			node = node.setdefault(word, {})
+		node[None] = token
+	return trie
+
+# translates the text with the token translations returned by loadPhraseTranslations
+def translateText(text_snippet, phraseTranslations):
+	tokenTranslatedDict, tokenTranslatedTrie = phraseTranslations
+	words_in_text = whitespace_pattern.split(text_snippet)
 
 	taken = [0 for word in words_in_text]
 	translation = ['NULL' for word in words_in_text]
 
 	N = len(words_in_text)
-	for n in range(N,1,-1):
-		nPhrases = getNgrams(words_in_text, n)
-		for i,phrase in enumerate(nPhrases):
-			not_taken = True
-			phrase_text = " ".join(phrase)
-			for pos in range(i,i+len(phrase)):
-				if taken[pos] == 1:
-					not_taken = False
-					break
-			if not_taken and phrase_text in tokenTranslatedDict:
-				translated_phrase = tokenTranslatedDict[phrase_text]
-				translation[i] = translated_phrase
-				taken[i] = 1
-				for pos in range(i+1,i+len(phrase)):
-					translation[pos] = ''
-					taken[pos] = 1
+	# from each word the trie is walked along the following words, which finds all the
+	# translated tokens starting there in one pass and stops as soon as no token continues.
+	# The n-gram passes cover phrases of 1 to N-1 words, longest first and left to right,
+	# so the matches are applied in that order
+	matches = []
+	for i in range(N):
+		node = tokenTranslatedTrie
+		for j in range(i, min(N, i+N-1)):
+			node = node.get(words_in_text[j])
+			if node is None:
+				break
+			phrase_text = node.get(None)
+			if phrase_text is not None:
+				matches.append((i-j-1, i, phrase_text))
+	matches.sort()
+	for phrase_len,i,phrase_text in matches:
+		phrase_len = -phrase_len
+		if not any(taken[i:i+phrase_len]):
+			translation[i] = tokenTranslatedDict[phrase_text]
+			translation[i+1:i+phrase_len] = ['']*(phrase_len-1)
+			taken[i:i+phrase_len] = [1]*phrase_len
 	for index,value in enumerate(taken):
 		if value == 0:
 			translation[index] = words_in_text[index]
@@ -464,9 +662,9 @@ if __name__ == '__main__':
 	# add_rules_toDB(db,"hi","rules_to_DB_draft2.txt")
 
 
-	loadPhraseTranslations(db,1,2)
+	phraseTranslations = loadPhraseTranslations(db,1)
 
-	print(translateText('1 3 2 1 2 5 4 0 5'))
-	print(translateText(' '))
-	print(translateText('   '))
+	print(translateText('1 3 2 1 2 5 4 0 5', phraseTranslations))
+	print(translateText(' ', phraseTranslations))
+	print(translateText('   ', phraseTranslations))
 	db.close()
\ No newline at end of file
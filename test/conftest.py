@@ -0,0 +1,174 @@
+import os
+import re
+import pytest
+import json
+import requests
+import requests_mock
+from concurrent.futures import ThreadPoolExecutor, wait
+from filelock import FileLock
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+# ------------- one http session shared by all the tests --------------- #
+# keeps the connection to the api alive between requests, instead of a new
+# TCP and TLS handshake for every auth and api call
+@pytest.fixture(scope="session")
+def http():
+	s = requests.Session()
+	s.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=20,
+		max_retries=Retry(total=2, backoff_factor=0.2)))
+	yield s
+	s.close()
+
+
+base_url = "https://stagingapi.autographamt.com"
+
+
+# ------------- access tokens, one login per role for the run ----------- #
+# when the login fails the fixtures skip instead, and being session scoped they
+# skip every test of that role right away, without calling the api for each one
+def login(http, email, password):
+	url = base_url + "/v1/auth"
+	data = {'email':email,
+		'password':password}
+	try:
+		resp = http.post(url, data=data)
+		respobj = resp.json()
+		token = respobj['accessToken']
+	except (requests.RequestException, ValueError, KeyError) as ex:
+		pytest.skip("auth unavailable for {}: {!r}".format(email, ex))
+	return token
+
+# with pytest-xdist (run_pytest.sh) each worker has its own session, so the
+# first worker to log in leaves the token in the temp dir shared by the
+# workers of the run and the others read it from there
+def shared_login(token_dir, http, email, password):
+	if token_dir is None:
+		return login(http, email, password)
+	token_file = token_dir.join("token_%s.json" % email)
+	with FileLock(str(token_file) + ".lock"):
+		if token_file.check():
+			return json.loads(token_file.read())['accessToken']
+		token = login(http, email, password)
+		token_file.write(json.dumps({'accessToken': token}))
+	return token
+
+role_logins = {
+	"adm": ("alex@yopmail.com", "1189"),                  # admin role
+	"sup": ('savitha.mark@bridgeconn.com', '221189'),     # super admin role
+	"sup2": ('joelcjohnson123@gmail.com', '111111'),      # second super admin role
+	"trans": ('ag2@yopmail.com', '1189'),                 # normal role
+}
+
+# the logins started by login_futures, which the replay fixture waits for
+started_logins = []
+
+# the logins of all the roles are started together on the pooled session, so
+# their round trips overlap instead of running one after the other. A failed
+# login skips only the tests of its role, when its token is asked for
+@pytest.fixture(scope="session")
+def login_futures(request, http):
+	token_dir = None
+	if request.config.pluginmanager.hasplugin("xdist") and request.getfixturevalue("worker_id") != "master":
+		token_dir = request.getfixturevalue("tmpdir_factory").getbasetemp().dirpath()
+	pool = ThreadPoolExecutor(max_workers=len(role_logins))
+	futures = {role: pool.submit(shared_login, token_dir, http, email, password)
+		for role, (email, password) in role_logins.items()}
+	pool.shutdown(wait=False)
+	started_logins.extend(futures.values())
+	return futures
+
+# --------------- admin role-----------#
+@pytest.fixture(scope="session")
+def get_adm_accessToken(login_futures):
+	return login_futures["adm"].result()
+
+#----------- su-admin--------------#
+@pytest.fixture(scope="session")
+def get_supAdmin_accessToken(login_futures):
+	return login_futures["sup"].result()
+
+# the super admin of the bible languages and organisation approval tests
+@pytest.fixture(scope="session")
+def get_supAdmin2_accessToken(login_futures):
+	return login_futures["sup2"].result()
+
+#----------- normal user--------------#
+@pytest.fixture(scope="session")
+def get_trans_accessToken(login_futures):
+	return login_futures["trans"].result()
+
+
+# ------------- sessions that send the token of a role ------------------ #
+# they mount the adapter of http, so the requests of every role still go over
+# its pooled connections
+def role_session(http, token):
+	s = requests.Session()
+	s.mount("https://", http.get_adapter(base_url))
+	s.headers['Authorization'] = f'bearer {token}'
+	return s
+
+# module scoped, so that a test file overriding a token fixture gets a session
+# with its own token
+@pytest.fixture(scope="module")
+def adm_session(http, get_adm_accessToken):
+	return role_session(http, get_adm_accessToken)
+
+@pytest.fixture(scope="module")
+def sup_session(http, get_supAdmin_accessToken):
+	return role_session(http, get_supAdmin_accessToken)
+
+@pytest.fixture(scope="module")
+def sup2_session(http, get_supAdmin2_accessToken):
+	return role_session(http, get_supAdmin2_accessToken)
+
+@pytest.fixture(scope="module")
+def trans_session(http, get_trans_accessToken):
+	return role_session(http, get_trans_accessToken)
+
+# the session of the role named by the parameter, for tests parametrized over
+# the roles with indirect=True. A replayed test doesn't log in
+@pytest.fixture
+def role(request):
+	if replaying(request):
+		return role_session(request.getfixturevalue("http"), "replay")
+	return request.getfixturevalue({"adm": "adm_session", "sup": "sup_session", "sup2": "sup2_session", "trans": "trans_session"}[request.param])
+
+
+# ------------- replaying canned responses ------------------------------ #
+# the tests always call the staging api, unless --replay is given. Then the tests
+# marked replay are served the responses in test/fixtures instead, to check the
+# tests themselves without the api. Those are written by hand after the responses
+# built in main.py, so a replayed run says nothing about the api
+def pytest_addoption(parser):
+	parser.addoption("--replay", action="store_true",
+		help="serve the replay tests the canned responses in test/fixtures")
+
+def pytest_configure(config):
+	config.addinivalue_line("markers",
+		"replay: served the canned responses in test/fixtures with --replay")
+
+fixtures_dir = os.path.join(os.path.dirname(__file__), "fixtures")
+
+replayed_responses = [
+	("/v1/bibles/languages", "bible_languages.json"),
+	("/v1/translations/", "translations_no_sense.json"),
+]
+
+def replaying(request):
+	return "replay" in request.keywords and request.config.getoption("replay")
+
+@pytest.fixture(autouse=True)
+def replay(request):
+	if not replaying(request):
+		yield None
+		return
+	# the mocker patches every session, so a login still going on would be answered
+	# by it instead of the api, and its failure kept as the skip of the whole role
+	wait(started_logins)
+	with requests_mock.Mocker() as m:
+		for path, name in replayed_responses:
+			with open(os.path.join(fixtures_dir, name)) as f:
+				m.get(re.compile(re.escape(base_url + path)), json=json.load(f))
+		yield m
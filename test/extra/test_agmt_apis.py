@@ -40,9 +40,9 @@ def check_login(url,email,password):
 	resp = requests.post(url, data=data)
 	return resp
 
-def test_firstpage_load():
+def test_firstpage_load(http):
 	url = "https://staging.autographamt.com"
-	resp = requests.get(url)
+	resp = http.head(url, allow_redirects=True)
 	assert resp.status_code == 200, resp.text
 
 @pytest.mark.parametrize("email, password",[("kavitharaju18@gmail.com",'111111')])
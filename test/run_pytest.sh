@@ -1,52 +1,55 @@
-pytest test_getbiblelanguages.py
-pytest test_verifications.py
-pytest test_gettranslationwordshelp.py
-pytest test_contenttype.py
-pytest test_createbiblesource.py
-pytest test_createorganisations.py
-pytest test_bibleversetext.py
-pytest test_userlist.py
-pytest test_updateprojecttokentranslation.py
-pytest test_gettranslatedbooks.py
-pytest test_activateorganisation.py
-pytest test_gettranslatedwords.py
-pytest test_activatesource.py
-pytest test_getbibles.py
-pytest test_GetTokenlist.py
-pytest test_activateproject.py
-pytest test_createproject.py
-pytest test_listprojects2.py
-pytest test_resetpassword.py
-pytest test_setnewpass.py
-pytest test_projecttranslation.py
-pytest test_availablebooks.py
-pytest test_createprojectassignment.py
-pytest test_getuserprojects.py
-pytest test_projassigned_userlist.py
-pytest test_bibleversetext2.py
-pytest test_projectstatistics.py
-pytest test_registrations.py
-pytest test_translatedtokens.py
-pytest test_organisationslist.py
-pytest test_forgotpassword.py
-pytest test_getbibleverse.py
-pytest test_getbiblebooks.py
-pytest test_verseinrange.py
-pytest test_orgapproval.py
-pytest test_getalllanguages.py
-pytest test_booktext.py
-pytest test_getbibleverse2.py
-pytest test_auth.py
-pytest test_contentdetails.py
-pytest test_sources.py
-pytest test_versiondetails.py
-pytest test_generateconcordances.py
-pytest test_getavailableprojectbooks.py
-pytest test_projectslist.py
-pytest test_getbiblechapters.py
-pytest test_getsources.py
-pytest test_userapprovals.py
-pytest test_updatetokentranslations.py
-pytest test_activateuser.py
-pytest test_getalllanguagescontent.py
-pytest test_uploadbooks.py
+# the tests are independent calls to the api, run them in parallel. --dist loadfile
+# keeps the tests of a file on one worker, with the fixtures of that file
+pytest -n auto --dist loadfile \
+	test_getbiblelanguages.py \
+	test_verifications.py \
+	test_gettranslationwordshelp.py \
+	test_contenttype.py \
+	test_createbiblesource.py \
+	test_createorganisations.py \
+	test_bibleversetext.py \
+	test_userlist.py \
+	test_updateprojecttokentranslation.py \
+	test_gettranslatedbooks.py \
+	test_activateorganisation.py \
+	test_gettranslatedwords.py \
+	test_activatesource.py \
+	test_getbibles.py \
+	test_GetTokenlist.py \
+	test_activateproject.py \
+	test_createproject.py \
+	test_listprojects2.py \
+	test_resetpassword.py \
+	test_setnewpass.py \
+	test_projecttranslation.py \
+	test_availablebooks.py \
+	test_createprojectassignment.py \
+	test_getuserprojects.py \
+	test_projassigned_userlist.py \
+	test_bibleversetext2.py \
+	test_projectstatistics.py \
+	test_registrations.py \
+	test_translatedtokens.py \
+	test_organisationslist.py \
+	test_forgotpassword.py \
+	test_getbibleverse.py \
+	test_getbiblebooks.py \
+	test_verseinrange.py \
+	test_orgapproval.py \
+	test_getalllanguages.py \
+	test_booktext.py \
+	test_getbibleverse2.py \
+	test_auth.py \
+	test_contentdetails.py \
+	test_sources.py \
+	test_versiondetails.py \
+	test_generateconcordances.py \
+	test_getavailableprojectbooks.py \
+	test_projectslist.py \
+	test_getbiblechapters.py \
+	test_getsources.py \
+	test_userapprovals.py \
+	test_updatetokentranslations.py \
+	test_activateuser.py \
+	test_getalllanguagescontent.py \
+	test_uploadbooks.py
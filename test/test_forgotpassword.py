@@ -41,8 +41,8 @@ data = [
 
 
 # -------------------- Check page --------------------#
-def test_pageload():
-	resp = requests.get("https://staging.autographamt.com/signin")
+def test_pageload(http):
+	resp = http.head("https://staging.autographamt.com/signin", allow_redirects=True)
 	assert resp.status_code == 200
 
 
@@ -1,78 +1,28 @@
   # -- coding: utf - 8 --
 import pytest
-import requests
-import json
-
-@pytest.fixture
-def supply_url():
-	return "https://stagingapi.autographamt.com"
-
-
-@pytest.fixture
-def get_adm_accessToken():
-	email = "alex@yopmail.com"
-	password = "1189"
-	url = "https://stagingapi.autographamt.com/v1/auth"
-	data = {'email':email,
-			'password':password}
-	resp = requests.post(url, data=data)
-	respobj = json.loads(resp.text)
-	token = respobj['accessToken']
-
-	return token
-
-@pytest.fixture
-def get_supAdmin_accessToken():
-	email = 'savitha.mark@bridgeconn.com'
-	password = '221189'
-	url = "https://stagingapi.autographamt.com/v1/auth"
-	data = {'email':email,
-			'password':password}
-	resp = requests.post(url, data=data)
-	respobj = json.loads(resp.text)
-	token = respobj['accessToken']
-
-	return token
-
-@pytest.fixture
-def get_trans_accessToken():
-	email = 'ag2@yopmail.com'
-	password = '1189'
-	url = "https://stagingapi.autographamt.com/v1/auth"
-	data = {'email':email,
-			'password':password}
-	resp = requests.post(url, data=data)
-	respobj = json.loads(resp.text)
-	token = respobj['accessToken']
-	return token
-
-def test_getTranslatedwordssup(supply_url,get_supAdmin_accessToken):
-	url = supply_url + '/v1/translations/30/18/करो'
-	resp = requests.get(url,headers={'Authorization': 'bearer {}'.format(get_supAdmin_accessToken)})
-	j = json.loads(resp.text)
+from urllib.parse import quote
+
+pytestmark = pytest.mark.replay
+
+# the token is quoted once here, instead of by requests on every call
+translations_url = "https://stagingapi.autographamt.com/v1/translations/30/18/"
+karo_url = translations_url + quote('करो')
+kapde_url = translations_url + quote('कपडे')
+
+@pytest.mark.parametrize('role,url',[
+	('sup', karo_url),
+	('adm', karo_url),
+	('trans', kapde_url),
+],indirect=['role'])
+def test_getTranslatedwords(role,url):
+	resp = role.get(url)
 	assert resp.status_code == 200, resp.text
+	j = resp.json()
 	assert j['success'] == False, str(j)
 	assert j['message'] == "No Translation or sense available for this token", str(j)
 
-def test_getTranslatedwordsad(supply_url,get_adm_accessToken):
-	url = supply_url + '/v1/translations/30/18/करो'
-	resp = requests.get(url,headers={'Authorization': 'bearer {}'.format(get_adm_accessToken)})
-	j = json.loads(resp.text)
+@pytest.mark.parametrize('role',['trans'],indirect=True)
+def test_getTranslatedwordstr(role):
+	resp = role.get(karo_url)
+	j = resp.json()
 	assert resp.status_code == 200, resp.text
-	assert j['success'] == False, str(j)
-	assert j['message'] == "No Translation or sense available for this token", str(j)
-	
-def test_getTranslatedwordstr(supply_url,get_trans_accessToken):
-	url = supply_url + '/v1/translations/30/18/करो'
-	resp = requests.get(url,headers={'Authorization': 'bearer {}'.format(get_trans_accessToken)})
-	j = json.loads(resp.text)
-	assert resp.status_code == 200, resp.text
-
-def test_getTranslatedwordstr2(supply_url,get_trans_accessToken):
-	url = supply_url + '/v1/translations/30/18/कपडे'
-	resp = requests.get(url,headers={'Authorization': 'bearer {}'.format(get_trans_accessToken)})
-	j = json.loads(resp.text)
-	assert resp.status_code == 200, resp.text
-	assert j['success'] == False, str(j)
-	assert j['message'] == "No Translation or sense available for this token", str(j)
-
@@ -1,6 +1,4 @@
 import pytest
-import requests
-import json
 
 @pytest.fixture
 def url():
@@ -8,13 +6,6 @@ def url():
 	return "https://stagingapi.autographamt.com/v1/autographamt/approvals/organisations"
 
 
-data = [
-	('alex@yopmail.com', '1189'),                # admin role
-	('joelcjohnson123@gmail.com', '111111'),     # super admin role
-	('ag2@yopmail.com', '1189')                  # normal role
-]
-
-
 def orglist():
 	data1 = [
 			(26, True)   # new organisation details
@@ -28,46 +19,16 @@ def jsondump(data1):
 	return(jsondump)
 
 
-# ------------------------- get access token --------------------------- #
-def get_accesstoken(email, password):
-	auth_url = 'https://stagingapi.autographamt.com/v1/auth'
-	resp = requests.post(auth_url, {'email': email, 'password': password})
-	out = json.loads(resp.text)
-	token = out['accessToken']
-	return token
-
-
-# ------------------ organisation approval with admin role---------------# 
-@pytest.mark.parametrize('data',[data])
-def test_organisationapprov(url, data):
-	access_token = get_accesstoken(data[0][0], data[0][1])
-	org = orglist()
-	jsondata = jsondump(org[0])
-	resp = requests.post(url,data=json.dumps(jsondata),headers={'Authorization': 'bearer {}'.format(access_token)})
-	out = json.loads(resp.text)
-	assert out['success'] == False
-	assert out['message'] == "Unauthorized"
-
-
-# ------------------ organisation approval with super-admin role---------------# 
-@pytest.mark.parametrize('data',[data])
-def test_organisationapprov1(url, data):
-	access_token = get_accesstoken(data[1][0], data[1][1])
-	org = orglist()
-	jsondata = jsondump(org[0])
-	resp = requests.post(url,data=json.dumps(jsondata),headers={'Authorization': 'bearer {}'.format(access_token)})
-	out = json.loads(resp.text)
-	assert out['success'] == True
-	assert out['message'] == "Role Updated"
-
-
-# ------------------ organisation approval with normal role---------------# 
-@pytest.mark.parametrize('data',[data])
-def test_organisationapprov2(url, data):
-	access_token = get_accesstoken(data[2][0], data[2][1])
+# -------- organisation approval with admin, super-admin and normal role -------# 
+@pytest.mark.parametrize('role,success,message',[
+	('adm', False, "Unauthorized"),
+	('sup2', True, "Role Updated"),
+	('trans', False, "Unauthorized"),
+], ids=['admin', 'super-admin', 'normal'], indirect=['role'])
+def test_organisationapprov(role, url, success, message):
 	org = orglist()
 	jsondata = jsondump(org[0])
-	resp = requests.post(url,data=json.dumps(jsondata),headers={'Authorization': 'bearer {}'.format(access_token)})
-	out = json.loads(resp.text)
-	assert out['success'] == False
-	assert out['message'] == "Unauthorized"
\ No newline at end of file
+	resp = role.post(url,json=jsondata)
+	out = resp.json()
+	assert out['success'] == success
+	assert out['message'] == message
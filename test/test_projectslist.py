@@ -24,8 +24,8 @@ def get_accesstoken(email, password):
 
 
 # -------------------- Check page --------------------#
-def test_pageload():
-	resp = requests.get("https://staging.autographamt.com")
+def test_pageload(http):
+	resp = http.head("https://staging.autographamt.com", allow_redirects=True)
 	assert resp.status_code == 200
 
 
@@ -14,9 +14,9 @@ def setnewpass(temporaryPassword,password):
 	resp = requests.post(url, data=data)
 	return resp
 
-def test_setnewpass_load():
+def test_setnewpass_load(http):
 	url = "https://staging.autographamt.com/forgotpassword"
-	resp = requests.get(url)
+	resp = http.head(url, allow_redirects=True)
 	assert resp.status_code == 200, resp.text
 
 @pytest.mark.skip(reason="need to change the values")
@@ -14,8 +14,8 @@ data = [
 ]
 
 # -------------------- Check page --------------------#
-def test_pageload():
-	resp = requests.get("https://staging.autographamt.com/signup")
+def test_pageload(http):
+	resp = http.head("https://staging.autographamt.com/signup", allow_redirects=True)
 	assert resp.status_code == 200
 
 # ----------------------- validating verification code --------------------#